@@ -9,33 +9,65 @@ from __future__ import annotations
 
 import asyncio
 import base64
+import binascii
+import functools
 import hashlib
+import http.client
+import io
 import ipaddress
 import json
+import mmap
 import os
+import re
+import shlex
 import shutil
-import socket
 import ssl
+import stat
 import subprocess
 import sys
 import tarfile
 import tempfile
+import textwrap
 import threading
 import time
+import urllib.error
 import urllib.request
 import uuid
 import zipfile
-from dataclasses import asdict, dataclass
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, fields
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Optional, Sequence
 from urllib.parse import urljoin, urlparse
-from urllib.request import HTTPRedirectHandler, Request, build_opener
+from urllib.request import Request
+from xml.sax.saxutils import escape as xml_escape
 
-from aiohttp import ClientSession, WSMsgType, web
+from aiohttp import ClientSession, ClientTimeout, TCPConnector, WSMsgType, web
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.asymmetric import ec
 
+try:
+    import orjson
+except ImportError:  # optional: older agent images don't ship it
+    orjson = None
+
+try:
+    import pybase64
+except ImportError:  # optional: SIMD base64 for tunnel bodies and bundles
+    pybase64 = None
+
+try:
+    import uvloop
+except ImportError:  # optional: faster event loop, default asyncio otherwise
+    uvloop = None
+
+try:
+    import blake3
+except ImportError:  # optional: only needed for EE_DIR_FINGERPRINT_ALG=blake3
+    blake3 = None
+
 _repo_root = Path(__file__).resolve().parent.parent
 if str(_repo_root) not in sys.path:
     sys.path.insert(0, str(_repo_root))
@@ -82,11 +114,60 @@ def log(msg: str) -> None:
     print(msg, file=sys.stderr)
 
 
-def load_template(name: str) -> str:
-    """Load a template file from the templates directory."""
+def loads_json(data: bytes | str):
+    """Parse JSON straight from bytes or str (orjson when available)."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps_json(obj) -> str:
+    """Serialize to compact JSON (orjson when available)."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, separators=(",", ":"))
+
+
+def dumps_json_bytes(obj) -> bytes:
+    """Serialize to compact UTF-8 JSON bytes, skipping the str round trip."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+
+# aiohttp's json_response with the orjson-backed encoder
+json_response = functools.partial(web.json_response, dumps=dumps_json)
+
+
+def b64encode_bytes(data) -> bytes:
+    """Base64-encode a bytes-like object without a trailing newline (pybase64 when available)."""
+    if pybase64 is not None:
+        return pybase64.b64encode(data)
+    return binascii.b2a_base64(data, newline=False)
+
+
+def b64decode_text(text: str) -> bytes:
+    """Leniently decode an ASCII base64 str without copying it to bytes first."""
+    if pybase64 is not None:
+        return pybase64.b64decode(text)
+    return binascii.a2b_base64(text)
+
+
+@functools.lru_cache(maxsize=None)
+def _read_template(name: str) -> str:
     return (TEMPLATES_DIR / name).read_text()
 
 
+def load_template(name: str) -> str:
+    """Load a template file from the templates directory (cached).
+
+    Set EE_TEMPLATES_NO_CACHE to re-read templates from disk on every call.
+    """
+    if env_bool("EE_TEMPLATES_NO_CACHE"):
+        _read_template.cache_clear()
+    return _read_template(name)
+
+
 def env_bool(name: str, default: bool = False) -> bool:
     value = os.getenv(name)
     if value is None or value == "":
@@ -96,10 +177,9 @@ def env_bool(name: str, default: bool = False) -> bool:
 
 def check_requirements() -> None:
     """Check that TDX and libvirt are available. Fails fast if not."""
-    result = subprocess.run(["uname", "-r"], capture_output=True, text=True)
-    if result.returncode != 0:
+    kernel = os.uname().release
+    if not kernel:
         raise RuntimeError("Cannot get kernel version")
-    kernel = result.stdout.strip()
     log(f"Kernel: {kernel}")
 
     tdx_enabled = False
@@ -133,21 +213,38 @@ def find_existing_images() -> list:
         "/opt/tdx/guest-tools/image",
         "/home/ubuntu/tdx/guest-tools/image",
     ]
-    patterns = ["*.qcow2", "*.img"]
+    # Suffix order matters: qcow2 images are listed before raw .img per directory
+    suffixes = (".qcow2", ".img")
     for search_path in search_paths:
-        if os.path.isdir(search_path):
-            for pattern in patterns:
-                import glob
-                for img in glob.glob(os.path.join(search_path, pattern)):
-                    try:
-                        size = os.path.getsize(img)
-                        images.append({
-                            "path": img,
-                            "size_gb": round(size / (1024**3), 2),
-                            "name": os.path.basename(img),
-                        })
-                    except Exception:
-                        pass
+        try:
+            with os.scandir(search_path) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        # One pass per directory; DirEntry caches the stat result so each
+        # image costs a single stat() call.
+        matches: dict[str, list] = {suffix: [] for suffix in suffixes}
+        for entry in entries:
+            name = entry.name
+            if name.startswith("."):
+                continue
+            suffix = next((s for s in suffixes if name.endswith(s)), None)
+            if suffix is None:
+                continue
+            try:
+                st = entry.stat()
+            except OSError as exc:
+                log(f"Warning: cannot stat {entry.path}: {exc}")
+                continue
+            if not stat.S_ISREG(st.st_mode):
+                continue
+            matches[suffix].append({
+                "path": entry.path,
+                "size_gb": round(st.st_size / (1024**3), 2),
+                "name": name,
+            })
+        for suffix in suffixes:
+            images.extend(matches[suffix])
     return images
 
 
@@ -263,9 +360,8 @@ def find_td_image() -> str:
 
 
 def indent_yaml(content: str, spaces: int) -> str:
-    """Indent YAML content."""
-    indent = " " * spaces
-    return "\n".join(indent + line for line in content.split("\n"))
+    """Indent YAML content, including blank lines."""
+    return textwrap.indent(content, " " * spaces, lambda _: True)
 
 
 def build_extra_files_yaml(extra_files: list[dict[str, str]] | None) -> str:
@@ -290,6 +386,12 @@ def build_extra_files_yaml(extra_files: list[dict[str, str]] | None) -> str:
     return "\n".join(blocks)
 
 
+@functools.lru_cache(maxsize=None)
+def get_quote_yaml() -> str:
+    """Return the static get-quote.py template pre-indented for user-data."""
+    return indent_yaml(load_template("get-quote.py"), 6)
+
+
 def create_workload_image(
     base_image: str,
     docker_compose_content: str,
@@ -308,7 +410,6 @@ def create_workload_image(
     )
 
     start_sh = load_template("start.sh").replace("{port}", str(port))
-    get_quote = load_template("get-quote.py")
     network_config = load_template("network-config.yml")
 
     ssh_config = ""
@@ -322,7 +423,7 @@ ssh_pwauth: false
         ssh_config=ssh_config,
         docker_compose=indent_yaml(docker_compose_content, 6),
         start_sh=indent_yaml(start_sh, 6),
-        get_quote=indent_yaml(get_quote, 6),
+        get_quote=get_quote_yaml(),
         extra_files=extra_files_yaml,
     )
 
@@ -356,6 +457,13 @@ ssh_pwauth: false
 
 def generate_tdx_domain_xml(name: str, disk_path: str, cidata_iso: str, memory_mb: int, vcpus: int) -> str:
     """Generate libvirt domain XML for TDX."""
+    # Values land in element text and single-quoted attributes
+    entities = {"'": "&apos;", '"': "&quot;"}
+    name = xml_escape(name, entities)
+    disk_path = xml_escape(disk_path, entities)
+    cidata_iso = xml_escape(cidata_iso, entities)
+    memory_mb = int(memory_mb)
+    vcpus = int(vcpus)
     return f"""<domain type='kvm'>
   <name>{name}</name>
   <memory unit='MiB'>{memory_mb}</memory>
@@ -457,78 +565,84 @@ def start_td_vm(
     return ip
 
 
-def get_public_ip() -> str:
-    """Get the host's public IP address."""
-    methods = [
-        lambda: subprocess.run(
-            ["hostname", "-I"],
-            capture_output=True, text=True, timeout=5
-        ).stdout.split()[0] if not subprocess.run(
-            ["hostname", "-I"], capture_output=True, text=True, timeout=5
-        ).stdout.split()[0].startswith(("192.168.", "10.", "172.")) else None,
-        lambda: urllib.request.urlopen("https://ifconfig.me", timeout=5).read().decode().strip(),
-        lambda: urllib.request.urlopen("https://api.ipify.org", timeout=5).read().decode().strip(),
-    ]
-    for method in methods:
+PUBLIC_IP_SERVICES = ("https://ifconfig.me", "https://api.ipify.org")
+
+
+PUBLIC_IP_TTL_SEC = 60
+PUBLIC_IP_CACHE: tuple[float, str] | None = None
+
+
+def _lookup_public_ip() -> str:
+    """Resolve the public IP; raises if nothing public is found."""
+
+    def is_public(ip: str) -> bool:
         try:
-            ip = method()
-            if ip and not ip.startswith(("192.168.", "10.", "172.16.", "172.17.", "172.18.")):
-                return ip
-        except Exception:
-            continue
+            return ipaddress.ip_address(ip).is_global
+        except ValueError:
+            return False
+
+    # Interface addresses first: a single hostname -I and no network round-trip
     try:
         result = subprocess.run(["hostname", "-I"], capture_output=True, text=True, timeout=5)
         for ip in result.stdout.split():
-            if not ip.startswith(("192.168.", "10.", "172.", "127.")):
+            if is_public(ip) and ":" not in ip:
                 return ip
-    except Exception:
+    except (OSError, subprocess.SubprocessError):
         pass
-    return ""
+
+    for url in PUBLIC_IP_SERVICES:
+        try:
+            with urllib.request.urlopen(url, timeout=5) as response:
+                ip = response.read().decode().strip()
+        except Exception:
+            continue
+        if is_public(ip):
+            return ip
+
+    raise RuntimeError("Could not determine public IP address")
+
+
+def get_public_ip() -> str:
+    """Get the host's public IP address, or "" if it can't be determined.
+
+    Successful lookups are reused for PUBLIC_IP_TTL_SEC so a network
+    reconfiguration is still picked up; failures are retried next call.
+    """
+    global PUBLIC_IP_CACHE
+    now = time.monotonic()
+    if PUBLIC_IP_CACHE and now < PUBLIC_IP_CACHE[0]:
+        return PUBLIC_IP_CACHE[1]
+    try:
+        ip = _lookup_public_ip()
+    except RuntimeError:
+        return ""
+    PUBLIC_IP_CACHE = (now + PUBLIC_IP_TTL_SEC, ip)
+    return ip
 
 
 def setup_port_forward(vm_ip: str, vm_port: int, host_port: int | None = None) -> int:
     """Set up iptables port forwarding from host to VM."""
     host_port = host_port or vm_port
 
-    def remove_nat_rules(chain: str) -> None:
-        result = subprocess.run(
-            ["sudo", "iptables", "-t", "nat", "-L", chain, "--line-numbers"],
-            capture_output=True,
-            text=True,
-        )
-        if result.returncode != 0:
-            return
-        rule_numbers = []
-        for line in result.stdout.splitlines():
-            parts = line.split()
-            if not parts or not parts[0].isdigit():
-                continue
-            if (
-                f"dpt:{host_port}" in line
-                and "DNAT" in line
-                and f"to:{vm_ip}:{vm_port}" in line
-            ):
-                rule_numbers.append(int(parts[0]))
-        for number in reversed(rule_numbers):
-            subprocess.run(["sudo", "iptables", "-t", "nat", "-D", chain, str(number)], capture_output=True)
-
-    def remove_forward_rules() -> None:
-        result = subprocess.run(["sudo", "iptables", "-L", "FORWARD", "--line-numbers"], capture_output=True, text=True)
-        if result.returncode != 0:
-            return
-        rule_numbers = []
-        for line in result.stdout.splitlines():
-            parts = line.split()
-            if not parts or not parts[0].isdigit():
-                continue
-            if f"dpt:{vm_port}" in line and vm_ip in line and "ACCEPT" in line:
-                rule_numbers.append(int(parts[0]))
-        for number in reversed(rule_numbers):
-            subprocess.run(["sudo", "iptables", "-D", "FORWARD", str(number)], capture_output=True)
-
-    remove_nat_rules("PREROUTING")
-    remove_nat_rules("OUTPUT")
-    remove_forward_rules()
+    # Match stale rules against one iptables-save dump with precompiled patterns
+    stale_patterns = {
+        "nat": re.compile(
+            rf"^-A (?:PREROUTING|OUTPUT) .*--dport {host_port}\b.* -j DNAT "
+            rf"--to-destination {re.escape(vm_ip)}:{vm_port}\b"
+        ),
+        "filter": re.compile(
+            rf"^-A FORWARD .*-d {re.escape(vm_ip)}(?:/32)? .*--dport {vm_port}\b.* -j ACCEPT\b"
+        ),
+    }
+    result = subprocess.run(["sudo", "iptables-save"], capture_output=True, text=True)
+    table = ""
+    for line in result.stdout.splitlines() if result.returncode == 0 else []:
+        if line.startswith("*"):
+            table = line[1:]
+            continue
+        pattern = stale_patterns.get(table)
+        if pattern and pattern.match(line):
+            subprocess.run(["sudo", "iptables", "-t", table, "-D"] + shlex.split(line)[1:], capture_output=True)
 
     result = subprocess.run(
         ["sudo", "iptables", "-t", "nat", "-A", "PREROUTING", "-p", "tcp", "--dport", str(host_port),
@@ -560,41 +674,57 @@ def setup_port_forward(vm_ip: str, vm_port: int, host_port: int | None = None) -
     return host_port
 
 
-def wait_for_ready(ip: str, port: int = 8081, timeout: int = 300) -> None:
-    """Wait for workload to be ready by checking port."""
-    start = time.time()
+async def wait_for_ready_async(ip: str, port: int = 8081, timeout: int = 300) -> None:
+    """Wait for workload to be ready by probing its port with async connects."""
+    loop = asyncio.get_running_loop()
+    start = loop.time()
     last_print = 0
-    while time.time() - start < timeout:
-        elapsed = int(time.time() - start)
+    delay = 0.05
+    while loop.time() - start < timeout:
+        elapsed = int(loop.time() - start)
         if elapsed - last_print >= 30:
             last_print = elapsed
             log(f"Waiting for port {port}... ({elapsed}s elapsed)")
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(5)
-            result = sock.connect_ex((ip, port))
-            sock.close()
-            if result == 0:
-                log(f"Port {port} is open on {ip}")
-                time.sleep(2)
-                return
-        except Exception:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout=5)
+        except (OSError, asyncio.TimeoutError):
+            await asyncio.sleep(delay)
+            delay = min(delay * 1.7, 5.0)
+            continue
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
             pass
-        time.sleep(5)
+        log(f"Port {port} is open on {ip}")
+        await asyncio.sleep(2)
+        return
     raise TimeoutError(f"Port {port} not ready within {timeout}s")
 
 
+def wait_for_ready(ip: str, port: int = 8081, timeout: int = 300) -> None:
+    """Blocking wrapper for callers running on deployment threads."""
+    asyncio.run(wait_for_ready_async(ip, port=port, timeout=timeout))
+
+
 def get_quote_from_vm(ip: str, port: int = 8081) -> str:
     """Retrieve quote from VM via HTTP. Returns base64-encoded quote."""
     url = f"http://{ip}:{port}/quote.json"
     log(f"Fetching quote from {url}")
-    response = urllib.request.urlopen(url, timeout=30)
-    data = json.loads(response.read().decode())
+    with urllib.request.urlopen(url, timeout=30) as response:
+        data = loads_json(response.read())
     if not data.get("success"):
         raise RuntimeError(f"Quote generation failed in VM: {data.get('error', 'unknown')}")
-    if not data.get("quote"):
+    if data.get("quote"):
+        return data["quote"]
+    quote_path = data.get("quote_path")
+    if not quote_path:
         raise RuntimeError("No quote in VM response")
-    return data["quote"]
+    with urllib.request.urlopen(f"http://{ip}:{port}/{quote_path}", timeout=30) as response:
+        quote = response.read()
+    if not quote:
+        raise RuntimeError("Empty quote in VM response")
+    return base64.b64encode(quote).decode()
 
 
 def create_td_vm(
@@ -670,6 +800,68 @@ def cleanup_td_vms(prefixes: Sequence[str] | None = None) -> None:
         subprocess.run(["sudo", "virsh", "undefine", name, "--nvram", "--remove-all-storage"], capture_output=True)
 
 
+_GITHUB_CONNECTIONS = threading.local()
+GITHUB_IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "PUT", "DELETE", "OPTIONS"})
+GITHUB_MAX_REDIRECTS = 5
+
+
+def github_api_request(
+    method: str,
+    url: str,
+    headers: dict,
+    data: bytes | None = None,
+    _redirects: int = 0,
+) -> bytes:
+    """
+    Send a GitHub API request over a keep-alive HTTPS connection.
+
+    Connections are cached per thread and host, so a burst of release calls
+    pays for one TLS handshake instead of one per request. GET and HEAD follow
+    redirects; any other 3xx is raised as an HTTPError.
+    """
+    parts = urlparse(url)
+    path = parts.path + (f"?{parts.query}" if parts.query else "")
+    headers = {"User-Agent": "easy-enclave", **headers}
+    local = _GITHUB_CONNECTIONS
+    connections = getattr(local, "by_host", None)
+    if connections is None:
+        connections = local.by_host = {}
+    for attempt in range(2):
+        conn = connections.get(parts.netloc)
+        reused = conn is not None
+        if conn is None:
+            conn = connections[parts.netloc] = http.client.HTTPSConnection(parts.netloc, timeout=30)
+        try:
+            conn.request(method, path, body=data, headers=headers)
+            response = conn.getresponse()
+            body = response.read()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            conn.close()
+            connections.pop(parts.netloc, None)
+            # The server may have closed an idle keep-alive connection. Only
+            # replay methods that are safe to repeat: a POST may have landed.
+            if attempt or not reused or method not in GITHUB_IDEMPOTENT_METHODS:
+                raise
+            continue
+        except Exception:
+            conn.close()
+            connections.pop(parts.netloc, None)
+            raise
+        if 300 <= response.status < 400:
+            location = response.headers.get("Location")
+            if method not in ("GET", "HEAD") or not location or _redirects >= GITHUB_MAX_REDIRECTS:
+                raise urllib.error.HTTPError(url, response.status, response.reason, response.headers, None)
+            target = urljoin(url, location)
+            if urlparse(target).netloc != parts.netloc:
+                # Never forward the token to another host
+                headers = {k: v for k, v in headers.items() if k.lower() != "authorization"}
+            return github_api_request(method, target, headers, data, _redirects=_redirects + 1)
+        if response.status >= 400:
+            raise urllib.error.HTTPError(url, response.status, response.reason, response.headers, None)
+        return body
+    raise RuntimeError("unreachable")
+
+
 def cleanup_deploy_releases(repo: str, token: str, prefix: str = "deploy-") -> None:
     """Delete existing deploy releases so only one remains."""
     headers = {
@@ -678,27 +870,25 @@ def cleanup_deploy_releases(repo: str, token: str, prefix: str = "deploy-") -> N
         "X-GitHub-Api-Version": "2022-11-28",
     }
     try:
-        req = urllib.request.Request(
-            f"https://api.github.com/repos/{repo}/releases?per_page=100",
-            headers=headers,
-        )
-        with urllib.request.urlopen(req) as response:
-            releases = json.loads(response.read().decode())
-        for release in releases:
-            tag = release.get("tag_name", "")
-            release_id = release.get("id")
-            if not tag.startswith(prefix) or not release_id:
-                continue
-            delete_req = urllib.request.Request(
-                f"https://api.github.com/repos/{repo}/releases/{release_id}",
-                headers=headers,
-                method="DELETE",
-            )
+        releases = loads_json(github_api_request(
+            "GET", f"https://api.github.com/repos/{repo}/releases?per_page=100", headers,
+        ).decode())
+        stale = [
+            (release.get("tag_name", ""), release.get("id"))
+            for release in releases
+            if release.get("tag_name", "").startswith(prefix) and release.get("id")
+        ]
+
+        def delete_release(tag: str, release_id: int) -> None:
             try:
-                with urllib.request.urlopen(delete_req):
-                    pass
+                github_api_request("DELETE", f"https://api.github.com/repos/{repo}/releases/{release_id}", headers)
             except Exception as exc:
                 log(f"Warning: failed to delete release {tag}: {exc}")
+
+        # Deletes are independent; overlap the round-trips.
+        if stale:
+            with ThreadPoolExecutor(max_workers=min(8, len(stale))) as executor:
+                list(executor.map(lambda item: delete_release(*item), stale))
     except Exception as exc:
         log(f"Warning: release cleanup failed: {exc}")
 
@@ -732,6 +922,9 @@ def create_release(
         "seal_vm": seal_vm,
     }
 
+    # Serialized once: embedded in the release body and uploaded as the asset
+    attestation_json = json.dumps(attestation, indent=2)
+
     body = f"""# Easy Enclave Deployment
 
 **Endpoint**: {endpoint}
@@ -740,7 +933,7 @@ def create_release(
 ## Attestation
 
 ```json
-{json.dumps(attestation, indent=2)}
+{attestation_json}
 ```
 
 ## Usage
@@ -763,27 +956,24 @@ client = connect("{repo}")
         "draft": False,
         "prerelease": False,
     }
-    req = urllib.request.Request(
+    release_data = loads_json(github_api_request(
+        "POST",
         f"https://api.github.com/repos/{repo}/releases",
-        data=json.dumps(payload).encode(),
-        headers={**headers, "Content-Type": "application/json"},
-        method="POST",
-    )
-    with urllib.request.urlopen(req) as response:
-        release_data = json.loads(response.read().decode())
+        {**headers, "Content-Type": "application/json"},
+        dumps_json(payload).encode(),
+    ).decode())
     upload_url = release_data.get("upload_url", "").split("{", 1)[0]
     if not upload_url:
         raise RuntimeError("Release upload URL missing")
 
-    attestation_bytes = json.dumps(attestation, indent=2).encode()
-    upload_req = urllib.request.Request(
+    attestation_bytes = attestation_json.encode()
+    github_api_request(
+        "POST",
         f"{upload_url}?name=attestation.json",
-        data=attestation_bytes,
-        headers={**headers, "Content-Type": "application/json"},
-        method="POST",
+        {**headers, "Content-Type": "application/json"},
+        attestation_bytes,
     )
-    with urllib.request.urlopen(upload_req):
-        log("Uploaded attestation.json")
+    log("Uploaded attestation.json")
 
     return release_data.get("html_url") or f"https://github.com/{repo}/releases/tag/{tag}"
 
@@ -801,8 +991,17 @@ EE_AGENT_ID = os.getenv("EE_AGENT_ID", str(uuid.uuid4()))
 EE_BACKEND_URL = os.getenv("EE_BACKEND_URL", "http://127.0.0.1:8081")
 EE_HEALTH_INTERVAL_SEC = int(os.getenv("EE_HEALTH_INTERVAL_SEC", "60"))
 EE_RECONNECT_DELAY_SEC = int(os.getenv("EE_RECONNECT_DELAY_SEC", "5"))
+EE_TUNNEL_WORKERS = max(1, int(os.getenv("EE_TUNNEL_WORKERS", "4")))
+TUNNEL_QUEUE_SIZE = 128
+TUNNEL_SEND_HIGH_WATER = 64
+PROXY_CHUNK_SIZE = 64 * 1024
+# The control plane gives up after 15 s; a hung backend must not pin a worker longer.
+# Streamed responses are bounded per connect/read instead, so long bodies still finish.
+EE_PROXY_TIMEOUT_SEC = int(os.getenv("EE_PROXY_TIMEOUT_SEC", "15"))
 EE_RATLS_ENABLED = env_bool("EE_RATLS_ENABLED", EE_MODE != "unsealed")
 EE_RATLS_CERT_TTL_SEC = int(os.getenv("EE_RATLS_CERT_TTL_SEC", "86400"))
+EE_DIR_FINGERPRINT_ALG = os.getenv("EE_DIR_FINGERPRINT_ALG", "sha256").lower()
+EE_ATTESTATION_CACHE_TTL_SEC = int(os.getenv("EE_ATTESTATION_CACHE_TTL_SEC", "30"))
 EE_RATLS_SKIP_PCCS = env_bool("EE_RATLS_SKIP_PCCS", False)
 EE_RATLS_REQUIRE_CLIENT_CERT = env_bool("EE_RATLS_REQUIRE_CLIENT_CERT", True)
 EE_CONTROL_ALLOWLIST_PATH = os.getenv("EE_CONTROL_ALLOWLIST_PATH", "")
@@ -873,6 +1072,14 @@ class Deployment:
         self.updated_at = now
 
 
+DEPLOYMENT_FIELDS = tuple(field.name for field in fields(Deployment))
+
+
+def deployment_to_dict(deployment: Deployment) -> dict:
+    """Shallow field dict; unlike asdict() nothing is deep-copied."""
+    return {name: getattr(deployment, name) for name in DEPLOYMENT_FIELDS}
+
+
 def ensure_deployments_dir() -> None:
     """Ensure deployments directory exists."""
 
@@ -898,23 +1105,24 @@ def save_deployment(deployment: Deployment) -> None:
     ensure_deployments_dir()
     deployment.updated_at = datetime.now(timezone.utc).isoformat()
     path = DEPLOYMENTS_DIR / f"{deployment.id}.json"
-    with open(path, "w") as f:
-        data = asdict(deployment)
-        data.pop("bundle_b64", None)
-        data.pop("private_env", None)
-        json.dump(data, f, indent=2)
+    data = deployment_to_dict(deployment)
+    data.pop("bundle_b64", None)
+    data.pop("private_env", None)
+    # Write-then-rename so API handlers never read a half-written record
+    tmp_path = path.with_suffix(".json.tmp")
+    tmp_path.write_bytes(dumps_json_bytes(data))
+    os.replace(tmp_path, path)
 
 
 def load_deployment(deployment_id: str) -> Optional[Deployment]:
     """Load deployment state from file."""
 
     path = DEPLOYMENTS_DIR / f"{deployment_id}.json"
-    if not path.exists():
+    try:
+        data = loads_json(path.read_bytes())
+    except FileNotFoundError:
         return None
-    with open(path) as f:
-        data = json.load(f)
-    fields = Deployment.__annotations__.keys()
-    filtered = {key: value for key, value in data.items() if key in fields}
+    filtered = {key: data[key] for key in DEPLOYMENT_FIELDS if key in data}
     return Deployment(**filtered)
 
 
@@ -922,12 +1130,12 @@ def read_tail(path: str, max_bytes: int = 20000) -> str:
     """Read the tail of a log file."""
 
     try:
-        with open(path, "rb") as f:
-            f.seek(0, os.SEEK_END)
-            size = f.tell()
-            start = max(size - max_bytes, 0)
-            f.seek(start)
-            data = f.read()
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            start = max(os.fstat(fd).st_size - max_bytes, 0)
+            data = os.pread(fd, max_bytes, start)
+        finally:
+            os.close(fd)
         return data.decode(errors="replace")
     except FileNotFoundError:
         return ""
@@ -935,34 +1143,159 @@ def read_tail(path: str, max_bytes: int = 20000) -> str:
         return f"[log read error: {e}]"
 
 
+# OpenSSL-backed constructor; OpenSSL picks the SHA-NI / ARMv8 crypto code
+# path at runtime, so measurements get hardware SHA-256 without a native shim.
+_sha256 = hashlib.sha256
+# Below this, one read() is cheaper than setting up and faulting in a mapping
+MMAP_HASH_THRESHOLD = 1024 * 1024
+
+# path -> (stat signature, hex digest); entries are replaced when the file changes
+_HASH_CACHE: dict[str, tuple[tuple, str]] = {}
+_HASH_CACHE_LOCK = threading.Lock()
+
+# "alg:root" -> [(file stat signature, hasher state after that file), ...] in
+# digest order, so a changed tree only rehashes from its first changed file
+_DIR_HASH_SNAPSHOTS: dict[str, list[tuple[tuple, object]]] = {}
+
+
+def stat_signature(path: Path | str, st: os.stat_result) -> tuple:
+    # ctime is included because userspace can reset mtime (os.utime) after an
+    # in-place rewrite of the same size, but any write or utime bumps ctime
+    return (str(path), st.st_mtime_ns, st.st_ctime_ns, st.st_size, st.st_ino)
+
+
+def cached_digest(key: str, signature: tuple, compute) -> str:
+    """Return the cached digest for key if its stat signature still matches."""
+    with _HASH_CACHE_LOCK:
+        entry = _HASH_CACHE.get(key)
+    if entry and entry[0] == signature:
+        return entry[1]
+    digest = compute()
+    with _HASH_CACHE_LOCK:
+        _HASH_CACHE[key] = (signature, digest)
+    return digest
+
+
+def update_hash_from_file(h, f) -> None:
+    """Feed an open binary file into a hash, mapping large files instead of copying them."""
+    size = os.fstat(f.fileno()).st_size
+    if size <= MMAP_HASH_THRESHOLD:
+        h.update(f.read())
+        return
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if hasattr(mm, "madvise"):
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        h.update(mm)
+
+
 def sha256_file(path: Path) -> str:
-    """Hash a file using SHA256."""
+    """Hash a file using SHA256, skipping the read when its stat is unchanged."""
 
-    h = hashlib.sha256()
-    with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(1024 * 1024), b""):
-            h.update(chunk)
-    return h.hexdigest()
+    def compute() -> str:
+        with open(path, "rb", buffering=0) as f:
+            if os.fstat(f.fileno()).st_size <= MMAP_HASH_THRESHOLD and hasattr(hashlib, "file_digest"):
+                # read+update loop runs entirely in C
+                return hashlib.file_digest(f, _sha256).hexdigest()
+            h = _sha256()
+            update_hash_from_file(h, f)
+        return h.hexdigest()
+
+    return cached_digest(f"file:{path}", stat_signature(path, os.stat(path)), compute)
 
 
 def sha256_dir(root: Path) -> str:
-    """Hash a directory tree deterministically."""
+    """Hash a directory tree deterministically with SHA-256."""
+    return fingerprint_dir(root, "sha256")
 
-    h = hashlib.sha256()
-    skip_names = {"__pycache__", ".git", "deployments", "tmp"}
-    for path in sorted(p for p in root.rglob("*") if p.is_file()):
-        if any(part in skip_names for part in path.parts):
-            continue
-        rel = path.relative_to(root).as_posix().encode()
-        h.update(rel + b"\n")
-        with open(path, "rb") as f:
-            for chunk in iter(lambda: f.read(1024 * 1024), b""):
-                h.update(chunk)
+
+def fingerprint_dir(root: Path, alg: str) -> str:
+    """Hash a directory tree deterministically with sha256 or blake3.
+
+    A copy of the hasher state is kept after every file. Later calls stat the
+    tree, resume from the longest unchanged prefix and only hash what follows,
+    so an unchanged tree costs one stat per file instead of a full re-read.
+    """
+    if alg == "blake3":
+        if blake3 is None:
+            raise RuntimeError("blake3 fingerprinting requested but the blake3 package is not installed")
+        new_hash = functools.partial(blake3.blake3, max_threads=blake3.blake3.AUTO)
+    else:
+        new_hash = _sha256
+
+    entries = list(iter_tree_files(os.fspath(root), ""))
+    signatures = [stat_signature(full, st) for _, full, st in entries]
+    key = f"{alg}:{root}"
+    with _HASH_CACHE_LOCK:
+        snapshots = _DIR_HASH_SNAPSHOTS.get(key, [])
+    common = 0
+    limit = min(len(snapshots), len(signatures))
+    while common < limit and snapshots[common][0] == signatures[common]:
+        common += 1
+    if common == len(signatures) == len(snapshots):
+        return (snapshots[-1][1] if snapshots else new_hash()).hexdigest()
+
+    h = snapshots[common - 1][1].copy() if common else new_hash()
+    snapshots = snapshots[:common]
+    remaining = entries[common:]
+    # Keep one file of read-ahead in flight so the digest never waits on disk
+    upcoming = open_prefetched(remaining[0][1]) if remaining else None
+    for index, (rel, _, _) in enumerate(remaining):
+        f = upcoming
+        upcoming = open_prefetched(remaining[index + 1][1]) if index + 1 < len(remaining) else None
+        h.update(rel.replace(os.sep, "/").encode() + b"\n")
+        with f:
+            update_hash_from_file(h, f)
+        snapshots.append((signatures[common + index], h.copy()))
+    with _HASH_CACHE_LOCK:
+        _DIR_HASH_SNAPSHOTS[key] = snapshots
     return h.hexdigest()
 
 
+FINGERPRINT_SKIP_NAMES = frozenset({"__pycache__", ".git", "deployments", "tmp"})
+
+
+def iter_tree_files(root: str, rel_dir: str):
+    """Yield (rel, full, stat) for regular files under root in component-wise order.
+
+    Each directory is listed once and sorted by name, and subdirectories are
+    descended in place, so the output needs no global sort. Skipped names are
+    pruned before their subtree is listed; symlinked directories are not
+    followed.
+    """
+    dirpath = os.path.join(root, rel_dir) if rel_dir else root
+    try:
+        with os.scandir(dirpath) as it:
+            dir_entries = sorted(it, key=lambda entry: entry.name)
+    except OSError:
+        return
+    for entry in dir_entries:
+        name = entry.name
+        if name in FINGERPRINT_SKIP_NAMES:
+            continue
+        rel = os.path.join(rel_dir, name) if rel_dir else name
+        if entry.is_dir():
+            if not entry.is_symlink():
+                yield from iter_tree_files(root, rel)
+            continue
+        try:
+            st = entry.stat()
+        except OSError:
+            continue
+        if stat.S_ISREG(st.st_mode):
+            yield rel, entry.path, st
+
+
+def open_prefetched(path: Path | str):
+    """Open a file for reading and ask the kernel to start reading it ahead."""
+    f = open(path, "rb")
+    if hasattr(os, "posix_fadvise"):
+        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+    return f
+
+
+@functools.lru_cache(maxsize=1)
 def get_vm_image_id() -> str:
-    """Get the VM image identifier used for attestation."""
+    """Get the VM image identifier used for attestation (fixed for the VM's lifetime)."""
 
     env_id = os.environ.get("VM_IMAGE_ID")
     if env_id:
@@ -973,24 +1306,32 @@ def get_vm_image_id() -> str:
     raise RuntimeError("VM_IMAGE_ID not set")
 
 
+@functools.lru_cache(maxsize=1)
 def get_sealed_state() -> bool:
-    """Return sealed state based on environment."""
+    """Return sealed state based on environment (read once per process)."""
 
     value = os.environ.get("SEAL_VM", "").lower()
     return value in ("1", "true", "yes")
 
 
+REPORT_DATA_PADDING = bytes(32)
+
+
 def build_report_data(measurements: dict) -> bytes:
     """Build 64-byte report data from measurements."""
 
-    material = (
-        f"agent_dir={measurements['agent_dir_sha256']}\n"
-        f"agent_py={measurements['agent_py_sha256']}\n"
-        f"vm_image_id={measurements['vm_image_id']}\n"
-        f"sealed={str(measurements['sealed']).lower()}"
-    ).encode()
-    digest = hashlib.sha256(material).digest()
-    return digest + b"\x00" * 32
+    alg = measurements.get("fingerprint_alg", "sha256")
+    fragments = [
+        b"agent_dir=", measurements[f"agent_dir_{alg}"].encode(), b"\n",
+        b"agent_py=", measurements["agent_py_sha256"].encode(), b"\n",
+        b"vm_image_id=", measurements["vm_image_id"].encode(), b"\n",
+        b"sealed=", b"true" if measurements["sealed"] else b"false",
+    ]
+    if alg != "sha256":
+        # Bind the algorithm too; sha256 material stays byte-identical to older agents
+        fragments += [b"\nfingerprint_alg=", alg.encode()]
+    # One join beats per-fragment update() calls for inputs this small
+    return _sha256(b"".join(fragments)).digest() + REPORT_DATA_PADDING
 
 
 def get_tdx_quote(report_data: bytes) -> bytes:
@@ -1011,40 +1352,85 @@ def get_tdx_quote(report_data: bytes) -> bytes:
     return data
 
 
+MEASUREMENT_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ee-measure")
+
+
 def build_attestation() -> dict:
     """Build attestation payload for the agent."""
 
     agent_path = Path(__file__).resolve()
     agent_dir = Path(os.environ.get("EE_AGENT_DIR", agent_path.parent))
+    alg = "blake3" if EE_DIR_FINGERPRINT_ALG == "blake3" else "sha256"
+    # hashlib releases the GIL on large updates, so the two digests overlap on
+    # cache misses; the long-lived pool avoids spawning threads per attestation.
+    dir_digest = MEASUREMENT_EXECUTOR.submit(fingerprint_dir, agent_dir, alg)
+    file_digest = MEASUREMENT_EXECUTOR.submit(sha256_file, agent_path)
     measurements = {
-        "agent_dir_sha256": sha256_dir(agent_dir),
-        "agent_py_sha256": sha256_file(agent_path),
+        f"agent_dir_{alg}": dir_digest.result(),
+        "agent_py_sha256": file_digest.result(),
         "vm_image_id": get_vm_image_id(),
         "sealed": get_sealed_state(),
     }
+    if alg != "sha256":
+        measurements["fingerprint_alg"] = alg
     report_data = build_report_data(measurements)
     quote = get_tdx_quote(report_data)
     return {
-        "quote": base64.b64encode(quote).decode(),
+        "quote": b64encode_bytes(quote).decode("ascii"),
         "report_data": report_data.hex(),
         "measurements": measurements,
     }
 
 
+ATTESTATION_CACHE: tuple[float, dict] | None = None
+# Held for the whole rebuild so concurrent misses wait for one quote
+ATTESTATION_CACHE_LOCK = threading.Lock()
+
+
+def get_cached_attestation() -> dict:
+    """Return a recent attestation, rebuilding it after EE_ATTESTATION_CACHE_TTL_SEC.
+
+    The quote does not bind a caller nonce, so bursts of /attestation and
+    attest_request traffic can share one configfs-tsm round trip.
+    """
+    global ATTESTATION_CACHE
+    cached = ATTESTATION_CACHE
+    if cached and time.monotonic() < cached[0]:
+        return cached[1]
+    with ATTESTATION_CACHE_LOCK:
+        # Another thread may have rebuilt it while this one waited
+        cached = ATTESTATION_CACHE
+        now = time.monotonic()
+        if cached and now < cached[0]:
+            return cached[1]
+        attestation = build_attestation()
+        ATTESTATION_CACHE = (now + EE_ATTESTATION_CACHE_TTL_SEC, attestation)
+    return attestation
+
+
 @dataclass
 class RatlsMaterial:
     cert_path: Path
     key_path: Path
+    expires_at: float = 0.0
 
 
 RATLS_MATERIAL: RatlsMaterial | None = None
+RATLS_REFRESH_MARGIN_SEC = 60
+# Held while the cert/key pair on disk is swapped and while it is loaded, so a
+# reader never pairs a new cert with the old key (or the reverse)
+RATLS_FILES_LOCK = threading.Lock()
 
 
 def ensure_ratls_material(common_name: str = "easyenclave-agent") -> RatlsMaterial:
-    global RATLS_MATERIAL
-    if RATLS_MATERIAL:
+    """Return the cached RA-TLS cert/key, regenerating only close to expiry."""
+    if RATLS_MATERIAL and time.time() < RATLS_MATERIAL.expires_at - RATLS_REFRESH_MARGIN_SEC:
         return RATLS_MATERIAL
+    return refresh_ratls_material(common_name)
 
+
+def refresh_ratls_material(common_name: str = "easyenclave-agent") -> RatlsMaterial:
+    global RATLS_MATERIAL
     ratls_dir = Path("/var/lib/easy-enclave/ratls")
     ratls_dir.mkdir(parents=True, exist_ok=True)
     cert_path = ratls_dir / "ratls.crt"
@@ -1053,6 +1439,7 @@ def ensure_ratls_material(common_name: str = "easyenclave-agent") -> RatlsMateri
     key = ec.generate_private_key(ec.SECP256R1())
     report_data = report_data_for_pubkey(key.public_key())
     quote = get_tdx_quote(report_data)
+    expires_at = time.time() + EE_RATLS_CERT_TTL_SEC
     cert_pem = build_ratls_cert(quote, key, common_name=common_name, ttl_seconds=EE_RATLS_CERT_TTL_SEC)
     key_pem = key.private_bytes(
         encoding=serialization.Encoding.PEM,
@@ -1060,38 +1447,87 @@ def ensure_ratls_material(common_name: str = "easyenclave-agent") -> RatlsMateri
         encryption_algorithm=serialization.NoEncryption(),
     )
 
-    cert_path.write_bytes(cert_pem)
-    key_path.write_bytes(key_pem)
-    os.chmod(cert_path, 0o600)
-    os.chmod(key_path, 0o600)
+    with RATLS_FILES_LOCK:
+        write_private_file(key_path, key_pem)
+        write_private_file(cert_path, cert_pem)
 
-    RATLS_MATERIAL = RatlsMaterial(cert_path=cert_path, key_path=key_path)
+    RATLS_MATERIAL = RatlsMaterial(cert_path=cert_path, key_path=key_path, expires_at=expires_at)
     return RATLS_MATERIAL
 
 
+def write_private_file(path: Path, data: bytes) -> None:
+    """Replace path atomically with a 0600 file, so it is never seen half-written."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        os.fchmod(f.fileno(), 0o600)
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def load_ratls_chain(context: ssl.SSLContext, material: RatlsMaterial) -> None:
+    with RATLS_FILES_LOCK:
+        context.load_cert_chain(certfile=str(material.cert_path), keyfile=str(material.key_path))
+
+
+async def ratls_refresh_loop(context: ssl.SSLContext) -> None:
+    """Reissue the RA-TLS cert at half its lifetime, off the handshake path."""
+    while True:
+        await asyncio.sleep(max(EE_RATLS_CERT_TTL_SEC / 2, RATLS_REFRESH_MARGIN_SEC))
+        try:
+            material = await asyncio.to_thread(refresh_ratls_material)
+        except Exception as exc:
+            log(f"ratls_refresh_failed:{exc}")
+            continue
+        # New handshakes pick up the reloaded chain; live connections are unaffected
+        load_ratls_chain(context, material)
+
+
 def build_ratls_server_context(material: RatlsMaterial) -> ssl.SSLContext:
     # Use a bare server context so self-signed RA-TLS client certs are not
     # rejected by the default CA store before we verify them ourselves.
     context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
     context.check_hostname = False
     context.verify_mode = ssl.CERT_OPTIONAL if EE_RATLS_REQUIRE_CLIENT_CERT else ssl.CERT_NONE
-    context.load_cert_chain(certfile=str(material.cert_path), keyfile=str(material.key_path))
+    load_ratls_chain(context, material)
     context.minimum_version = ssl.TLSVersion.TLSv1_2
     return context
 
 
 def build_ratls_client_context(material: RatlsMaterial) -> ssl.SSLContext:
-    context = ssl.create_default_context()
+    # Keyed on expires_at so a refreshed cert gets a new context; reconnects reuse it
+    return _ratls_client_context(str(material.cert_path), str(material.key_path), material.expires_at)
+
+
+@functools.lru_cache(maxsize=1)
+def _ratls_client_context(cert_path: str, key_path: str, expires_at: float) -> ssl.SSLContext:
+    # The peer is verified via RA-TLS, not the CA store, so skip loading it
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
     context.check_hostname = False
     context.verify_mode = ssl.CERT_NONE
-    context.load_cert_chain(certfile=str(material.cert_path), keyfile=str(material.key_path))
+    with RATLS_FILES_LOCK:
+        context.load_cert_chain(certfile=cert_path, keyfile=key_path)
     context.minimum_version = ssl.TLSVersion.TLSv1_2
     return context
 
 
-def load_control_allowlist() -> Optional[dict]:
+CONTROL_ALLOWLIST: dict | None = None
+CONTROL_ALLOWLIST_LOADED = False
+
+
+def load_control_allowlist(refresh: bool = False) -> Optional[dict]:
+    """Return the parsed control-plane allowlist, fetched once unless refresh is set."""
+    global CONTROL_ALLOWLIST, CONTROL_ALLOWLIST_LOADED
+    if CONTROL_ALLOWLIST_LOADED and not refresh:
+        return CONTROL_ALLOWLIST
+    CONTROL_ALLOWLIST = fetch_control_allowlist()
+    CONTROL_ALLOWLIST_LOADED = True
+    return CONTROL_ALLOWLIST
+
+
+def fetch_control_allowlist() -> Optional[dict]:
     if EE_CONTROL_ALLOWLIST_PATH:
-        return json.loads(Path(EE_CONTROL_ALLOWLIST_PATH).read_text(encoding="utf-8"))
+        return loads_json(Path(EE_CONTROL_ALLOWLIST_PATH).read_bytes())
     if not EE_CONTROL_ALLOWLIST_REPO or not EE_CONTROL_ALLOWLIST_TAG:
         return None
 
@@ -1105,7 +1541,7 @@ def load_control_allowlist() -> Optional[dict]:
     release_url = f"https://api.github.com/repos/{EE_CONTROL_ALLOWLIST_REPO}/releases/tags/{EE_CONTROL_ALLOWLIST_TAG}"
     req = Request(release_url, headers=headers)
     with urllib.request.urlopen(req, timeout=10) as response:
-        release = json.loads(response.read().decode())
+        release = loads_json(response.read())
 
     asset_url = None
     for asset in release.get("assets", []):
@@ -1117,7 +1553,7 @@ def load_control_allowlist() -> Optional[dict]:
 
     req = Request(asset_url, headers=headers)
     with urllib.request.urlopen(req, timeout=10) as response:
-        return json.loads(response.read().decode())
+        return loads_json(response.read())
 
 
 def extract_peer_cert(ws) -> bytes:
@@ -1136,19 +1572,27 @@ def extract_peer_cert(ws) -> bytes:
 
 def verify_control_plane_ratls(ws) -> None:
     cert_der = extract_peer_cert(ws)
-    allowlist = load_control_allowlist()
-    result = verify_ratls_cert(
+    cached = CONTROL_ALLOWLIST_LOADED
+    result = verify_control_plane_cert(cert_der, load_control_allowlist())
+    if not result.verified and cached:
+        # The release tag can move (e.g. dev-latest) when the control plane is
+        # rebuilt; re-fetch once before rejecting it on a stale allowlist
+        result = verify_control_plane_cert(cert_der, load_control_allowlist(refresh=True))
+    if not result.verified:
+        raise RuntimeError(f"control_plane_ratls_failed:{result.reason}")
+
+
+def verify_control_plane_cert(cert_der: bytes, allowlist: Optional[dict]):
+    return verify_ratls_cert(
         cert_der,
         allowlist,
         pccs_url=os.getenv("EE_RATLS_PCCS_URL") or None,
         skip_pccs=EE_RATLS_SKIP_PCCS,
         require_allowlist=EE_CONTROL_ALLOWLIST_REQUIRED,
     )
-    if not result.verified:
-        raise RuntimeError(f"control_plane_ratls_failed:{result.reason}")
 
 
-def write_bundle_files(bundle_dir: str, compose_path: str, extra_files: list[dict[str, str]]) -> str:
+def write_bundle_files(bundle_dir: str, compose_path: str, extra_files: list[dict[str, str | bytes]]) -> str:
     """Write bundle files to /opt/workload and return compose path."""
 
     target_root = Path("/opt/workload")
@@ -1160,36 +1604,58 @@ def write_bundle_files(bundle_dir: str, compose_path: str, extra_files: list[dic
     compose_rel = src_compose.relative_to(bundle_root)
     target_compose = target_root / compose_rel
     target_compose.parent.mkdir(parents=True, exist_ok=True)
-    target_compose.write_text(src_compose.read_text(encoding="utf-8"), encoding="utf-8")
+    shutil.copyfile(src_compose, target_compose)
 
-    for entry in extra_files:
+    def write_entry(entry: dict[str, str | bytes]) -> None:
         rel_path = entry.get("path")
         if not rel_path:
-            continue
+            return
         dest_path = target_root / rel_path.lstrip("/")
         dest_path.parent.mkdir(parents=True, exist_ok=True)
+        content = entry.get("content", "")
         content_b64 = entry.get("content_b64")
-        if content_b64 is not None:
+        if entry.get("src"):
+            # copyfile uses sendfile on Linux; bytes never pass through Python
+            shutil.copyfile(entry["src"], dest_path)
+        elif content_b64 is not None:
             dest_path.write_bytes(base64.b64decode(content_b64))
+        elif isinstance(content, bytes):
+            dest_path.write_bytes(content)
         else:
-            dest_path.write_text(entry.get("content", ""), encoding="utf-8")
+            dest_path.write_text(content, encoding="utf-8")
         if entry.get("permissions"):
             os.chmod(dest_path, int(entry["permissions"], 8))
+
+    if len(extra_files) > 16:
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(write_entry, extra_files))
+    else:
+        for entry in extra_files:
+            write_entry(entry)
     return str(target_compose)
 
 
-def resolve_compose_command() -> list[str]:
-    """Return a compose command that exists on this host."""
+COMPOSE_CMD: Optional[tuple[str, ...]] = None
 
-    result = subprocess.run(
-        ["docker", "compose", "version"],
-        capture_output=True,
-        text=True,
-    )
-    if result.returncode == 0:
-        return ["docker", "compose"]
+
+def resolve_compose_command() -> tuple[str, ...]:
+    """Return a compose command that exists on this host, probing only once."""
+
+    global COMPOSE_CMD
+    if COMPOSE_CMD is not None:
+        return COMPOSE_CMD
+    if shutil.which("docker"):
+        result = subprocess.run(
+            ["docker", "compose", "version"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        if result.returncode == 0:
+            COMPOSE_CMD = ("docker", "compose")
+            return COMPOSE_CMD
     if shutil.which("docker-compose"):
-        return ["docker-compose"]
+        COMPOSE_CMD = ("docker-compose",)
+        return COMPOSE_CMD
     raise RuntimeError("docker compose is not available in the agent VM")
 
 
@@ -1223,7 +1689,9 @@ def docker_compose_down(compose_path: str) -> None:
         raise RuntimeError(f"docker compose down failed: {result.stderr.strip()}")
 
 
-def download_bundle_artifact(repo: str, artifact_id: int, token: Optional[str]) -> str:
+async def download_bundle_artifact(
+    session: ClientSession, repo: str, artifact_id: int, token: Optional[str]
+) -> str:
     """Download and extract a bundle artifact, returning the extract directory."""
 
     tmpdir = tempfile.mkdtemp(prefix="ee-bundle-")
@@ -1237,26 +1705,25 @@ def download_bundle_artifact(repo: str, artifact_id: int, token: Optional[str])
         headers["Authorization"] = f"token {token}"
 
     url = f"https://api.github.com/repos/{repo}/actions/artifacts/{artifact_id}/zip"
+    # Follow redirects by hand so the token is never sent to the blob host
+    for _ in range(10):
+        async with session.get(url, headers=headers, allow_redirects=False) as resp:
+            if resp.status in (301, 302, 303, 307, 308) and "Location" in resp.headers:
+                new_url = urljoin(url, resp.headers["Location"])
+                if urlparse(new_url).netloc != urlparse(url).netloc:
+                    headers.pop("Authorization", None)
+                url = new_url
+                continue
+            resp.raise_for_status()
+            # Stream to disk; the artifact is never held in memory
+            with open(zip_path, "wb") as f:
+                async for chunk in resp.content.iter_chunked(64 * 1024):
+                    f.write(chunk)
+            break
+    else:
+        raise RuntimeError("Too many redirects downloading bundle artifact")
 
-    class NoAuthRedirectHandler(HTTPRedirectHandler):
-        def redirect_request(self, req, fp, code, msg, hdrs, newurl):
-            new_req = super().redirect_request(req, fp, code, msg, hdrs, newurl)
-            if new_req is None:
-                return None
-            old_host = urlparse(req.full_url).netloc
-            new_host = urlparse(new_req.full_url).netloc
-            if old_host != new_host:
-                new_req.headers.pop("Authorization", None)
-            return new_req
-
-    req = Request(url, headers=headers)
-    opener = build_opener(NoAuthRedirectHandler())
-    with opener.open(req) as response, open(zip_path, "wb") as f:
-        f.write(response.read())
-
-    with zipfile.ZipFile(zip_path) as zf:
-        zf.extractall(tmpdir)
-
+    await run_deploy_step(extract_zip_parallel, zip_path, tmpdir)
     return tmpdir
 
 
@@ -1278,24 +1745,57 @@ def safe_extract_zip(archive: zipfile.ZipFile, dest: str) -> None:
     archive.extractall(dest)
 
 
+def extract_zip_parallel(zip_path: str, dest: str) -> None:
+    """Extract a zip file on disk, inflating members across worker threads."""
+
+    dest_path = os.path.abspath(dest)
+    with zipfile.ZipFile(zip_path) as zf:
+        members = zf.infolist()
+        if len(members) <= 16:
+            safe_extract_zip(zf, dest)
+            return
+        # target -> member; a later duplicate entry replaces an earlier one, as
+        # extractall would leave it on disk, and no two workers share a file
+        targets: dict[str, zipfile.ZipInfo] = {}
+        for member in members:
+            target = os.path.abspath(os.path.join(dest, member.filename))
+            if os.path.commonpath([dest_path, target]) != dest_path:
+                raise RuntimeError("Bundle archive contains unsafe path")
+            if member.is_dir():
+                os.makedirs(target, exist_ok=True)
+            else:
+                # Parents up front; workers creating them would race each other
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                targets[target] = member
+
+    def extract_batch(batch: list[tuple[str, zipfile.ZipInfo]]) -> None:
+        # A ZipFile shares one file position, so each worker opens its own
+        with zipfile.ZipFile(zip_path) as zf:
+            for target, member in batch:
+                with zf.open(member) as src, open(target, "wb") as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+
+    items = list(targets.items())
+    workers = min(8, os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(extract_batch, [items[i::workers] for i in range(workers)]))
+
+
 def materialize_inline_bundle(bundle_b64: str, bundle_format: Optional[str]) -> str:
     """Decode an inline bundle into a temp directory."""
     tmpdir = tempfile.mkdtemp(prefix="ee-bundle-")
     archive_format = (bundle_format or "tar.gz").lower()
-    archive_bytes = base64.b64decode(bundle_b64.encode("ascii"))
+    # Decode the ASCII str in place, skipping the str -> bytes copy
+    # b64decode would make; the BytesIO then owns the only decoded copy.
+    archive = io.BytesIO(b64decode_text(bundle_b64))
 
+    # Extract straight from memory; the archive never needs to touch disk
     if archive_format in {"tar.gz", "tgz"}:
-        archive_path = os.path.join(tmpdir, "bundle.tar.gz")
-        with open(archive_path, "wb") as f:
-            f.write(archive_bytes)
-        with tarfile.open(archive_path, "r:gz") as tar:
+        with tarfile.open(fileobj=archive, mode="r:gz", bufsize=1024 * 1024) as tar:
             safe_extract_tar(tar, tmpdir)
         return tmpdir
     if archive_format == "zip":
-        archive_path = os.path.join(tmpdir, "bundle.zip")
-        with open(archive_path, "wb") as f:
-            f.write(archive_bytes)
-        with zipfile.ZipFile(archive_path) as zf:
+        with zipfile.ZipFile(archive) as zf:
             safe_extract_zip(zf, tmpdir)
         return tmpdir
 
@@ -1306,51 +1806,52 @@ def load_bundle(bundle_dir: str) -> tuple[str, list[dict[str, str]], dict]:
     """Load docker-compose and extra files from the bundle."""
 
     root = Path(bundle_dir)
-    compose_paths = list(root.rglob("docker-compose.yml")) + list(root.rglob("docker-compose.yaml"))
-    if not compose_paths:
+    compose_names = ("docker-compose.yml", "docker-compose.yaml")
+    skip_names = {
+        *compose_names,
+        ".env.public",
+        "authorized_keys",
+        "bundle.zip",
+        "bundle.tar.gz",
+        "bundle.tgz",
+    }
+    # One walk collects compose candidates and extra files together
+    compose_paths: dict[str, list[Path]] = {name: [] for name in compose_names}
+    extra_paths: list[tuple[str, str]] = []
+    root_files: set[str] = set()
+    for dirpath, dirs, files in os.walk(bundle_dir):
+        dirs[:] = [name for name in dirs if name != "__pycache__"]
+        if dirpath == bundle_dir:
+            # Top-level names answer the lookups below without extra stats
+            root_files.update(files)
+        for name in files:
+            full = os.path.join(dirpath, name)
+            if name in compose_paths:
+                compose_paths[name].append(Path(full))
+            if name not in skip_names:
+                extra_paths.append((Path(os.path.relpath(full, bundle_dir)).as_posix(), full))
+
+    candidates = compose_paths["docker-compose.yml"] + compose_paths["docker-compose.yaml"]
+    if not candidates:
         raise FileNotFoundError("Bundle missing docker-compose.yml")
-    compose_root = root / "docker-compose.yml"
-    if not compose_root.exists():
-        compose_root = root / "docker-compose.yaml"
-    if compose_root.exists():
-        compose_path = compose_root
-    elif len(compose_paths) == 1:
-        compose_path = compose_paths[0]
+    root_compose = [name for name in compose_names if name in root_files]
+    if root_compose:
+        compose_path = root / root_compose[0]
+    elif len(candidates) == 1:
+        compose_path = candidates[0]
     else:
         raise ValueError("Bundle has multiple docker-compose files and no root compose")
 
     env_public = None
-    if (root / ".env.public").exists():
+    if ".env.public" in root_files:
         env_public = (root / ".env.public").read_text(encoding="utf-8")
 
     authorized_keys = None
-    if (root / "authorized_keys").exists():
+    if "authorized_keys" in root_files:
         authorized_keys = (root / "authorized_keys").read_text(encoding="utf-8")
 
-    extra_files = []
-    for path in root.rglob("*"):
-        if path.is_dir():
-            continue
-        if path.name in {
-            "docker-compose.yml",
-            "docker-compose.yaml",
-            ".env.public",
-            "authorized_keys",
-            "bundle.zip",
-            "bundle.tar.gz",
-            "bundle.tgz",
-        }:
-            continue
-        if "__pycache__" in path.parts:
-            continue
-        rel = path.relative_to(root).as_posix()
-        try:
-            content = path.read_text(encoding="utf-8")
-        except UnicodeDecodeError:
-            content_b64 = base64.b64encode(path.read_bytes()).decode("ascii")
-            extra_files.append({"path": rel, "content_b64": content_b64})
-            continue
-        extra_files.append({"path": rel, "content": content})
+    # Reference the extracted files; write_bundle_files copies them kernel-side
+    extra_files = [{"path": rel, "src": full} for rel, full in extra_paths]
 
     return str(compose_path), extra_files, {
         "env_public": env_public,
@@ -1358,8 +1859,64 @@ def load_bundle(bundle_dir: str) -> tuple[str, list[dict[str, str]], dict]:
     }
 
 
-def run_deployment(deployment: Deployment, token: Optional[str]) -> None:
-    """Background worker to execute deployment."""
+def write_deployment_env(deployment: Deployment, compose_path: str, bundle_meta: dict) -> None:
+    """Write the compose .env files and any bundled authorized_keys."""
+
+    compose_dir = Path(compose_path).parent
+    env_public_path = None
+    if bundle_meta.get("env_public"):
+        env_public_path = compose_dir / ".env.public"
+        env_public_path.write_text(bundle_meta["env_public"], encoding="utf-8")
+    env_private_path = None
+    if deployment.private_env:
+        env_private_path = compose_dir / ".env.private"
+        env_private_path.write_text(deployment.private_env, encoding="utf-8")
+        os.chmod(env_private_path, 0o600)
+    env_path = compose_dir / ".env"
+    parts = []
+    if env_public_path:
+        parts.append(env_public_path)
+    if env_private_path:
+        parts.append(env_private_path)
+    if parts:
+        with open(env_path, "w") as f:
+            for idx, part in enumerate(parts):
+                if idx:
+                    f.write("\n")
+                f.write(Path(part).read_text(encoding="utf-8"))
+
+    if bundle_meta.get("authorized_keys"):
+        os.makedirs("/home/ubuntu/.ssh", exist_ok=True)
+        with open("/home/ubuntu/.ssh/authorized_keys", "w") as f:
+            f.write(bundle_meta["authorized_keys"])
+        os.chmod("/home/ubuntu/.ssh/authorized_keys", 0o600)
+        try:
+            shutil.chown("/home/ubuntu/.ssh", user="ubuntu", group="ubuntu")
+            shutil.chown("/home/ubuntu/.ssh/authorized_keys", user="ubuntu", group="ubuntu")
+        except Exception as exc:
+            log(f"Warning: failed to chown authorized_keys: {exc}")
+
+
+DEPLOYMENT_TASKS: set[asyncio.Task] = set()
+# Long-lived loops started by run_servers; held here for the same reason
+BACKGROUND_TASKS: set[asyncio.Task] = set()
+# Deploy steps get their own small pool so a burst of /deploy calls cannot
+# crowd out the to_thread work behind the status and attestation handlers
+DEPLOY_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ee-deploy")
+
+
+async def run_deploy_step(func, *args, **kwargs):
+    """Run one blocking deployment step on DEPLOY_EXECUTOR."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(DEPLOY_EXECUTOR, functools.partial(func, *args, **kwargs))
+
+
+async def run_deployment(deployment: Deployment, token: Optional[str], session: ClientSession) -> None:
+    """Background task to execute deployment.
+
+    Runs on the agent's event loop; each blocking step goes to DEPLOY_EXECUTOR
+    so the tunnel and health loops keep running meanwhile.
+    """
 
     try:
         deployment.status = "deploying"
@@ -1367,68 +1924,43 @@ def run_deployment(deployment: Deployment, token: Optional[str]) -> None:
 
         if deployment.bundle_b64:
             log("Using inline bundle payload...")
-            bundle_dir = materialize_inline_bundle(deployment.bundle_b64, deployment.bundle_format)
+            bundle_dir = await run_deploy_step(
+                materialize_inline_bundle, deployment.bundle_b64, deployment.bundle_format
+            )
+            # Never persisted; release the encoded archive for the rest of the deploy
+            deployment.bundle_b64 = None
         elif deployment.bundle_artifact_id is not None:
             log(f"Downloading bundle artifact {deployment.bundle_artifact_id} for {deployment.repo}...")
-            bundle_dir = download_bundle_artifact(deployment.repo, deployment.bundle_artifact_id, token)
+            bundle_dir = await download_bundle_artifact(
+                session, deployment.repo, deployment.bundle_artifact_id, token
+            )
         else:
             raise RuntimeError("bundle_artifact_id or bundle_b64 is required for deployment")
 
-        compose_path, extra_files, bundle_meta = load_bundle(bundle_dir)
+        compose_path, extra_files, bundle_meta = await run_deploy_step(load_bundle, bundle_dir)
 
         if deployment.cleanup_prefixes:
             log("cleanup_prefixes ignored in single-VM mode")
         if deployment.vm_name:
             log("vm_name ignored in single-VM mode")
 
-        compose_path = write_bundle_files(bundle_dir, compose_path, extra_files)
+        compose_path = await run_deploy_step(write_bundle_files, bundle_dir, compose_path, extra_files)
         deployment.compose_path = compose_path
         save_deployment(deployment)
-        compose_dir = Path(compose_path).parent
-        env_public_path = None
-        if bundle_meta.get("env_public"):
-            env_public_path = compose_dir / ".env.public"
-            env_public_path.write_text(bundle_meta["env_public"], encoding="utf-8")
-        env_private_path = None
-        if deployment.private_env:
-            env_private_path = compose_dir / ".env.private"
-            env_private_path.write_text(deployment.private_env, encoding="utf-8")
-            os.chmod(env_private_path, 0o600)
-        env_path = compose_dir / ".env"
-        parts = []
-        if env_public_path:
-            parts.append(env_public_path)
-        if env_private_path:
-            parts.append(env_private_path)
-        if parts:
-            with open(env_path, "w") as f:
-                for idx, part in enumerate(parts):
-                    if idx:
-                        f.write("\n")
-                    f.write(Path(part).read_text(encoding="utf-8"))
-
-        if bundle_meta.get("authorized_keys"):
-            os.makedirs("/home/ubuntu/.ssh", exist_ok=True)
-            with open("/home/ubuntu/.ssh/authorized_keys", "w") as f:
-                f.write(bundle_meta["authorized_keys"])
-            os.chmod("/home/ubuntu/.ssh/authorized_keys", 0o600)
-            try:
-                shutil.chown("/home/ubuntu/.ssh", user="ubuntu", group="ubuntu")
-                shutil.chown("/home/ubuntu/.ssh/authorized_keys", user="ubuntu", group="ubuntu")
-            except Exception as exc:
-                log(f"Warning: failed to chown authorized_keys: {exc}")
+        await run_deploy_step(write_deployment_env, deployment, compose_path, bundle_meta)
 
-        run_docker_compose(compose_path)
+        await run_deploy_step(run_docker_compose, compose_path)
 
-        attestation = build_attestation()
+        attestation = await run_deploy_step(build_attestation)
         deployment.quote = attestation["quote"]
-        public_ip = get_public_ip()
+        public_ip = await run_deploy_step(get_public_ip)
         if not public_ip:
             log("Warning: unable to determine public IP; using localhost endpoint")
         deployment.vm_ip = public_ip
         endpoint = f"http://{public_ip or '127.0.0.1'}:{deployment.port}"
         try:
-            release_url = create_release(
+            release_url = await run_deploy_step(
+                create_release,
                 deployment.quote,
                 endpoint,
                 repo=deployment.repo,
@@ -1467,7 +1999,7 @@ def ensure_admin(request: web.Request) -> Optional[web.Response]:
         return None
     token = require_bearer_token(request)
     if token != EE_ADMIN_TOKEN:
-        return web.json_response({"error": "unauthorized"}, status=401)
+        return json_response({"error": "unauthorized"}, status=401)
     return None
 
 
@@ -1518,12 +2050,12 @@ def cleanup_all_deployments() -> list[str]:
 
 
 async def handle_deployments(_: web.Request) -> web.Response:
-    deployments = [asdict(d) for d in list_deployments()]
-    return web.json_response({"deployments": deployments})
+    deployments = [deployment_to_dict(d) for d in list_deployments()]
+    return json_response({"deployments": deployments})
 
 
 async def handle_health(_: web.Request) -> web.Response:
-    return web.json_response(
+    return json_response(
         {
             "status": "ok",
             "mode": EE_MODE,
@@ -1534,26 +2066,27 @@ async def handle_health(_: web.Request) -> web.Response:
 
 async def handle_attestation(_: web.Request) -> web.Response:
     try:
-        payload = build_attestation()
-        return web.json_response(payload)
+        payload = await asyncio.to_thread(get_cached_attestation)
+        return json_response(payload)
     except Exception as exc:
-        return web.json_response({"error": str(exc)}, status=500)
+        return json_response({"error": str(exc)}, status=500)
 
 
 async def handle_status(request: web.Request) -> web.Response:
     deployment_id = request.match_info["deployment_id"]
     deployment = load_deployment(deployment_id)
     if not deployment:
-        return web.json_response({"error": "Deployment not found"}, status=404)
-    payload = asdict(deployment)
+        return json_response({"error": "Deployment not found"}, status=404)
+    payload = deployment_to_dict(deployment)
     if deployment.vm_name:
         qemu_log = f"/var/log/libvirt/qemu/{deployment.vm_name}.log"
         serial_log = f"/var/log/libvirt/qemu/{deployment.vm_name}-serial.log"
-        payload["host_logs"] = {
-            "qemu": read_tail(qemu_log),
-            "serial": read_tail(serial_log),
-        }
-    return web.json_response(payload)
+        qemu, serial = await asyncio.gather(
+            asyncio.to_thread(read_tail, qemu_log),
+            asyncio.to_thread(read_tail, serial_log),
+        )
+        payload["host_logs"] = {"qemu": qemu, "serial": serial}
+    return json_response(payload)
 
 
 async def handle_admin_page(_: web.Request) -> web.Response:
@@ -1564,64 +2097,68 @@ async def handle_admin_undeploy(request: web.Request) -> web.Response:
     unauthorized = ensure_admin(request)
     if unauthorized:
         return unauthorized
-    warnings = cleanup_all_deployments()
+    warnings = await asyncio.to_thread(cleanup_all_deployments)
     attestation = None
     try:
-        attestation = build_attestation()
+        attestation = await asyncio.to_thread(build_attestation)
     except Exception as exc:
         warnings.append(f"attestation_failed:{exc}")
-    return web.json_response({"status": "ok", "warnings": warnings, "attestation": attestation})
+    return json_response({"status": "ok", "warnings": warnings, "attestation": attestation})
 
 
 async def handle_admin_update(request: web.Request) -> web.Response:
     unauthorized = ensure_admin(request)
     if unauthorized:
         return unauthorized
-    warnings = cleanup_all_deployments()
+    warnings = await asyncio.to_thread(cleanup_all_deployments)
     # Placeholder for future on-box update logic (e.g., pull new agent bits)
     attestation = None
     try:
-        attestation = build_attestation()
+        attestation = await asyncio.to_thread(build_attestation)
     except Exception as exc:
         warnings.append(f"attestation_failed:{exc}")
-    return web.json_response({"status": "ok", "warnings": warnings, "attestation": attestation})
+    return json_response({"status": "ok", "warnings": warnings, "attestation": attestation})
 
 
 async def handle_deploy(request: web.Request) -> web.Response:
     try:
-        data = await request.json()
+        # Parse the raw bytes: an inline bundle can be large, and orjson
+        # reads bytes directly without a decode to str first
+        data = loads_json(await request.read())
     except Exception:
-        return web.json_response({"error": "Invalid JSON"}, status=400)
+        return json_response({"error": "Invalid JSON"}, status=400)
+    if not isinstance(data, dict):
+        return json_response({"error": "Invalid JSON"}, status=400)
 
     repo = data.get("repo")
     if not repo:
-        return web.json_response({"error": "Missing required field: repo"}, status=400)
+        return json_response({"error": "Missing required field: repo"}, status=400)
 
     cleanup_prefixes = data.get("cleanup_prefixes")
     if cleanup_prefixes is not None:
         if not isinstance(cleanup_prefixes, list) or not all(isinstance(p, str) for p in cleanup_prefixes):
-            return web.json_response({"error": "cleanup_prefixes must be a list of strings"}, status=400)
+            return json_response({"error": "cleanup_prefixes must be a list of strings"}, status=400)
 
     bundle_artifact_id = data.get("bundle_artifact_id")
     bundle_b64 = data.get("bundle_b64") or None
     bundle_format = data.get("bundle_format")
     if bundle_b64 is not None:
         if not isinstance(bundle_b64, str):
-            return web.json_response({"error": "bundle_b64 must be a string"}, status=400)
+            return json_response({"error": "bundle_b64 must be a string"}, status=400)
         if bundle_format is not None and not isinstance(bundle_format, str):
-            return web.json_response({"error": "bundle_format must be a string"}, status=400)
+            return json_response({"error": "bundle_format must be a string"}, status=400)
         bundle_artifact_id = None
     else:
         if not isinstance(bundle_artifact_id, int):
-            return web.json_response({"error": "bundle_artifact_id must be an integer"}, status=400)
+            return json_response({"error": "bundle_artifact_id must be an integer"}, status=400)
 
     private_env = data.get("private_env")
     if private_env is not None and not isinstance(private_env, str):
-        return web.json_response({"error": "private_env must be a string"}, status=400)
+        return json_response({"error": "private_env must be a string"}, status=400)
 
     seal_vm = data.get("seal_vm", False)
     if not isinstance(seal_vm, bool):
-        return web.json_response({"error": "seal_vm must be a boolean"}, status=400)
+        return json_response({"error": "seal_vm must be a boolean"}, status=400)
 
     deployment = Deployment(
         id=str(uuid.uuid4()),
@@ -1639,42 +2176,216 @@ async def handle_deploy(request: web.Request) -> web.Response:
     save_deployment(deployment)
 
     token = require_bearer_token(request)
-    thread = threading.Thread(
-        target=run_deployment,
-        args=(deployment, token),
-        daemon=True,
-    )
-    thread.start()
+    task = asyncio.create_task(run_deployment(deployment, token, request.app["client_session"]))
+    # The loop only keeps weak references to tasks
+    DEPLOYMENT_TASKS.add(task)
+    task.add_done_callback(DEPLOYMENT_TASKS.discard)
 
-    return web.json_response({"deployment_id": deployment.id, "status": deployment.status}, status=202)
+    return json_response({"deployment_id": deployment.id, "status": deployment.status}, status=202)
 
 
-async def proxy_request(session: ClientSession, message: dict) -> dict:
+async def proxy_request(session: ClientSession, message: dict, sender: TunnelSender) -> None:
     request_id = message.get("request_id")
     method = message.get("method", "GET")
     path = message.get("path", "/")
     headers = message.get("headers") or {}
     body_b64 = message.get("body_b64") or ""
-    body = base64.b64decode(body_b64.encode("ascii")) if body_b64 else b""
+    body = b64decode_text(body_b64) if body_b64 else b""
 
     url = urljoin(EE_BACKEND_URL, path.lstrip("/"))
-    async with session.request(method, url, headers=headers, data=body) as resp:
-        response_body = await resp.read()
-        return {
-            "type": "proxy_response",
-            "request_id": request_id,
-            "status": resp.status,
-            "headers": dict(resp.headers),
-            "body_b64": base64.b64encode(response_body).decode("ascii"),
-        }
+    if message.get("stream"):
+        timeout = ClientTimeout(total=None, sock_connect=EE_PROXY_TIMEOUT_SEC, sock_read=EE_PROXY_TIMEOUT_SEC)
+    else:
+        timeout = ClientTimeout(total=EE_PROXY_TIMEOUT_SEC)
+    async with session.request(method, url, headers=headers, data=body, timeout=timeout) as resp:
+        if message.get("stream"):
+            # The control plane reassembles; only one chunk is in flight here
+            sender.send(
+                {
+                    "type": "proxy_response_headers",
+                    "request_id": request_id,
+                    "status": resp.status,
+                    "headers": dict(resp.headers),
+                }
+            )
+            binary = bool(message.get("binary"))
+            seq = 0
+            async for chunk in resp.content.iter_chunked(PROXY_CHUNK_SIZE):
+                if binary:
+                    # Raw bytes behind a one-line header: no base64 on either end
+                    sender.send_bytes(f"{request_id}:{seq}\n".encode("ascii") + chunk)
+                else:
+                    sender.send(
+                        {
+                            "type": "proxy_response_chunk",
+                            "request_id": request_id,
+                            "seq": seq,
+                            "data_b64": b64encode_bytes(chunk).decode("ascii"),
+                        }
+                    )
+                seq += 1
+                await sender.drain()
+            sender.send({"type": "proxy_response_end", "request_id": request_id})
+            return
+
+        # Encode as chunks arrive so the raw body is never held in full
+        # alongside its base64 form; only a <3 byte tail carries over.
+        encoded: list[bytes] = []
+        pending = b""
+        async for chunk in resp.content.iter_chunked(PROXY_CHUNK_SIZE):
+            data = pending + chunk if pending else chunk
+            cut = len(data) - len(data) % 3
+            encoded.append(b64encode_bytes(memoryview(data)[:cut]))
+            pending = data[cut:]
+        encoded.append(b64encode_bytes(pending))
+        sender.send(
+            {
+                "type": "proxy_response",
+                "request_id": request_id,
+                "status": resp.status,
+                "headers": dict(resp.headers),
+                "body_b64": b"".join(encoded).decode("ascii"),
+            }
+        )
 
 
-async def health_loop(ws) -> None:
+class TunnelSender:
+    """Serialize outbound tunnel frames through a single consumer.
+
+    Producers call send() without awaiting the socket; one writer task drains
+    the queue so frames from the health loop and message handlers never
+    interleave on the websocket.
+    """
+
+    def __init__(self, ws) -> None:
+        self.ws = ws
+        self._queue: deque[str | bytes] = deque()
+        self._waker: Optional[asyncio.Future] = None
+        self._drained: Optional[asyncio.Future] = None
+        self._closed = False
+
+    def send(self, message: dict) -> None:
+        self._enqueue(dumps_json(message))
+
+    def send_bytes(self, frame: bytes) -> None:
+        self._enqueue(frame)
+
+    def _enqueue(self, frame: str | bytes) -> None:
+        if self._closed:
+            # The writer is gone; nothing would ever send or discard the frame
+            return
+        self._queue.append(frame)
+        if self._waker and not self._waker.done():
+            self._waker.set_result(None)
+
+    async def drain(self) -> None:
+        """Wait for the writer when streamed frames pile up past the high-water mark.
+
+        Raises ConnectionResetError once the writer has stopped, so a streaming
+        producer stops reading its backend instead of waiting forever.
+        """
+        if self._closed or self.ws.closed:
+            raise ConnectionResetError("tunnel closed")
+        if len(self._queue) <= TUNNEL_SEND_HIGH_WATER:
+            return
+        if self._drained is None or self._drained.done():
+            self._drained = asyncio.get_running_loop().create_future()
+        await self._drained
+        if self._closed:
+            raise ConnectionResetError("tunnel closed")
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while not self.ws.closed:
+                if not self._queue:
+                    self._waker = loop.create_future()
+                    await self._waker
+                    self._waker = None
+                    continue
+                frame = self._queue.popleft()
+                if isinstance(frame, bytes):
+                    await self.ws.send_bytes(frame)
+                else:
+                    await self.ws.send_str(frame)
+                if self._drained and not self._drained.done() and len(self._queue) <= TUNNEL_SEND_HIGH_WATER:
+                    self._drained.set_result(None)
+        except Exception as exc:
+            log(f"tunnel_send_error={exc}")
+            # Closing ends the reader loop, which tears down this connection
+            await self.ws.close()
+        finally:
+            self._closed = True
+            self._queue.clear()
+            if self._drained and not self._drained.done():
+                self._drained.set_result(None)
+
+
+async def health_loop(ws, sender: TunnelSender) -> None:
     while not ws.closed:
         await asyncio.sleep(EE_HEALTH_INTERVAL_SEC)
         if ws.closed:
             return
-        await ws.send_json({"type": "health", "status": "pass"})
+        sender.send({"type": "health", "status": "pass"})
+
+
+async def handle_attest_request(payload: dict, sender: TunnelSender, _: ClientSession) -> None:
+    attestation = await asyncio.to_thread(get_cached_attestation)
+    sender.send(
+        {
+            "type": "attest_response",
+            "nonce": payload.get("nonce"),
+            "quote": attestation.get("quote"),
+            "report_data": attestation.get("report_data"),
+            "measurements": attestation.get("measurements"),
+        }
+    )
+
+
+async def handle_proxy_request(payload: dict, sender: TunnelSender, session: ClientSession) -> None:
+    try:
+        await proxy_request(session, payload, sender)
+    except Exception as exc:
+        # Answer now instead of leaving the control plane to time out; a
+        # proxy_response also discards a stream that already sent its headers
+        log(f"proxy_request_error={exc}")
+        sender.send(
+            {
+                "type": "proxy_response",
+                "request_id": payload.get("request_id"),
+                "status": 502,
+                "headers": {},
+                "body_b64": "",
+            }
+        )
+        return
+    sender.send({"type": "health", "status": "pass"})
+
+
+async def handle_tunnel_status(payload: dict, _: TunnelSender, __: ClientSession) -> None:
+    log(f"tunnel status: {payload.get('state')} {payload.get('reason')}")
+
+
+# Inbound tunnel message type -> handler; unknown types are ignored
+TUNNEL_HANDLERS = {
+    "attest_request": handle_attest_request,
+    "proxy_request": handle_proxy_request,
+    "status": handle_tunnel_status,
+}
+
+
+async def tunnel_worker(queue: asyncio.Queue, sender: TunnelSender, session: ClientSession) -> None:
+    """Handle inbound tunnel messages so one slow proxy request doesn't stall the rest."""
+    while True:
+        payload = await queue.get()
+        try:
+            handler = TUNNEL_HANDLERS.get(payload.get("type"))
+            if handler:
+                await handler(payload, sender, session)
+        except Exception as exc:
+            log(f"tunnel_message_error={exc}")
+        finally:
+            queue.task_done()
 
 
 async def tunnel_client_loop(app: web.Application) -> None:
@@ -1693,52 +2404,52 @@ async def tunnel_client_loop(app: web.Application) -> None:
         if not control_ws.startswith("wss://"):
             log("EE_CONTROL_WS must be wss:// when EE_RATLS_ENABLED=true")
             return
-        ssl_context = build_ratls_client_context(ensure_ratls_material())
+        try:
+            load_control_allowlist()
+        except Exception as exc:
+            log(f"control_allowlist_load_failed:{exc}")
     if not validate_control_ws(control_ws):
         return
 
+    # Shared across reconnects so pooled backend connections and DNS survive
+    session: ClientSession = app["client_session"]
     while True:
         try:
-            async with ClientSession() as session:
-                async with session.ws_connect(control_ws, ssl=ssl_context) as ws:
-                    if EE_RATLS_ENABLED:
-                        verify_control_plane_ratls(ws)
-                    await ws.send_json(
-                        {
-                            "type": "register",
-                            "repo": EE_REPO,
-                            "release_tag": EE_RELEASE_TAG,
-                            "app_name": EE_APP_NAME,
-                            "network": EE_NETWORK,
-                            "agent_id": EE_AGENT_ID,
-                            "tunnel_version": "1",
-                        }
-                    )
-                    health_task = asyncio.create_task(health_loop(ws))
+            if EE_RATLS_ENABLED:
+                # Cached until near expiry, so reconnects never present a stale cert
+                ssl_context = build_ratls_client_context(ensure_ratls_material())
+            async with session.ws_connect(control_ws, ssl=ssl_context) as ws:
+                if EE_RATLS_ENABLED:
+                    verify_control_plane_ratls(ws)
+                sender = TunnelSender(ws)
+                sender.send(
+                    {
+                        "type": "register",
+                        "repo": EE_REPO,
+                        "release_tag": EE_RELEASE_TAG,
+                        "app_name": EE_APP_NAME,
+                        "network": EE_NETWORK,
+                        "agent_id": EE_AGENT_ID,
+                        "tunnel_version": "1",
+                    }
+                )
+                send_task = asyncio.create_task(sender.run())
+                health_task = asyncio.create_task(health_loop(ws, sender))
+                # Bounded queue: a burst of slow proxy requests backpressures the reader
+                queue: asyncio.Queue[dict] = asyncio.Queue(maxsize=TUNNEL_QUEUE_SIZE)
+                workers = [
+                    asyncio.create_task(tunnel_worker(queue, sender, session))
+                    for _ in range(EE_TUNNEL_WORKERS)
+                ]
+                try:
                     async for msg in ws:
                         if msg.type == WSMsgType.TEXT:
-                            payload = msg.json()
-                            msg_type = payload.get("type")
-                            if msg_type == "attest_request":
-                                attestation = build_attestation()
-                                await ws.send_json(
-                                    {
-                                        "type": "attest_response",
-                                        "nonce": payload.get("nonce"),
-                                        "quote": attestation.get("quote"),
-                                        "report_data": attestation.get("report_data"),
-                                        "measurements": attestation.get("measurements"),
-                                    }
-                                )
-                            elif msg_type == "proxy_request":
-                                response = await proxy_request(session, payload)
-                                await ws.send_json(response)
-                                await ws.send_json({"type": "health", "status": "pass"})
-                            elif msg_type == "status":
-                                log(f"tunnel status: {payload.get('state')} {payload.get('reason')}")
+                            await queue.put(msg.json(loads=loads_json))
                         elif msg.type == WSMsgType.ERROR:
                             break
-                    health_task.cancel()
+                finally:
+                    for task in (health_task, send_task, *workers):
+                        task.cancel()
         except Exception as exc:
             log(f"tunnel_error={exc}")
         await asyncio.sleep(EE_RECONNECT_DELAY_SEC)
@@ -1765,9 +2476,20 @@ def build_main_app(control: Optional[ControlPlane]) -> web.Application:
             include_health=False,
         )
 
+    async def client_session(_: web.Application):
+        # No total deadline: the session outlives reconnects and carries
+        # artifact downloads that can run longer than aiohttp's 5 min default.
+        app["client_session"] = ClientSession(
+            connector=TCPConnector(limit=100, ttl_dns_cache=300, keepalive_timeout=75),
+            timeout=ClientTimeout(total=None, sock_connect=30),
+        )
+        yield
+        await app["client_session"].close()
+
     async def start_tunnel(_: web.Application) -> None:
         asyncio.create_task(tunnel_client_loop(app))
 
+    app.cleanup_ctx.append(client_session)
     app.on_startup.append(start_tunnel)
     return app
 
@@ -1812,6 +2534,9 @@ async def run_servers(
     ssl_context = None
     if EE_RATLS_ENABLED:
         ssl_context = build_ratls_server_context(ensure_ratls_material())
+        refresh_task = asyncio.create_task(ratls_refresh_loop(ssl_context))
+        BACKGROUND_TASKS.add(refresh_task)
+        refresh_task.add_done_callback(BACKGROUND_TASKS.discard)
     main_site = web.TCPSite(main_runner, main_host, main_port, ssl_context=ssl_context)
     await main_site.start()
 
@@ -1885,12 +2610,18 @@ def main() -> None:
                 raise SystemExit(1)
 
     ensure_deployments_dir()
+    try:
+        resolve_compose_command()
+    except RuntimeError as exc:
+        # Not fatal: docker may be installed later; deployments probe again
+        log(f"Warning: {exc}")
     log(f"Starting main on {main_host}:{main_port} (ratls={'on' if EE_RATLS_ENABLED else 'off'})")
     log(f"Starting admin on {admin_host}:{admin_port}")
     if EE_CONTROL_PLANE_ENABLED:
         log(f"Starting proxy on {proxy_host}:{proxy_port}")
     log(f"Deployments directory: {DEPLOYMENTS_DIR}")
-    asyncio.run(run_servers(main_host, main_port, admin_host, admin_port, proxy_host, proxy_port))
+    run = uvloop.run if uvloop is not None else asyncio.run
+    run(run_servers(main_host, main_port, admin_host, admin_port, proxy_host, proxy_port))
 
 
 if __name__ == "__main__":
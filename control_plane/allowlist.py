@@ -1,41 +1,138 @@
 from __future__ import annotations
 
 import json
+import threading
 import time
 from dataclasses import dataclass
-from typing import Optional
-from urllib.request import Request, urlopen
+from typing import Callable, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:  # optional: faster parsing of large allowlists
+    orjson = None
+
+
+def _loads_json(data: bytes):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
 
 
 @dataclass
 class AllowlistEntry:
     repo: str
     release_tag: str
-    allowlist: dict
+    allowlist: Optional[dict]
     fetched_at: float
+    error: Optional[str] = None
 
 
 class AllowlistCache:
-    def __init__(self, ttl_seconds: int = 300) -> None:
+    """Allowlists per (repo, tag), fetched at most once at a time per key.
+
+    Entries past the TTL but within twice it are served stale while a single
+    background refresh runs. Fetch failures are cached for a shorter window so
+    a missing asset is not re-requested by every caller.
+    """
+
+    def __init__(self, ttl_seconds: int = 300, negative_ttl_seconds: int = 30) -> None:
         self._ttl = ttl_seconds
+        self._negative_ttl = negative_ttl_seconds
         self._items: dict[tuple[str, str], AllowlistEntry] = {}
+        self._lock = threading.Lock()
+        self._in_flight: dict[tuple[str, str], threading.Event] = {}
 
     def get(self, repo: str, release_tag: str) -> Optional[dict]:
-        entry = self._items.get((repo, release_tag))
-        if not entry:
-            return None
-        if time.time() - entry.fetched_at > self._ttl:
-            self._items.pop((repo, release_tag), None)
-            return None
-        return entry.allowlist
+        with self._lock:
+            entry = self._items.get((repo, release_tag))
+            if not entry or entry.allowlist is None:
+                return None
+            if time.time() - entry.fetched_at > self._ttl:
+                return None
+            return entry.allowlist
 
     def put(self, repo: str, release_tag: str, allowlist: dict) -> None:
-        self._items[(repo, release_tag)] = AllowlistEntry(
-            repo=repo,
-            release_tag=release_tag,
-            allowlist=allowlist,
-            fetched_at=time.time(),
-        )
+        with self._lock:
+            self._items[(repo, release_tag)] = AllowlistEntry(
+                repo=repo,
+                release_tag=release_tag,
+                allowlist=allowlist,
+                fetched_at=time.time(),
+            )
+
+    def get_or_fetch(self, repo: str, release_tag: str, fetch: Callable[[], dict]) -> dict:
+        """Return the allowlist, calling fetch() only if no usable entry exists.
+
+        Blocks while another thread fetches the same key; raises RuntimeError
+        with the fetch error while a failure is negatively cached.
+        """
+        key = (repo, release_tag)
+        while True:
+            with self._lock:
+                entry = self._items.get(key)
+                if entry is not None:
+                    age = time.time() - entry.fetched_at
+                    if entry.allowlist is None:
+                        if age <= self._negative_ttl:
+                            raise RuntimeError(entry.error)
+                    elif age <= self._ttl:
+                        return entry.allowlist
+                    elif age <= 2 * self._ttl:
+                        if key not in self._in_flight:
+                            self._in_flight[key] = threading.Event()
+                            threading.Thread(target=self._refresh, args=(key, fetch), daemon=True).start()
+                        return entry.allowlist
+                waiter = self._in_flight.get(key)
+                if waiter is None:
+                    self._in_flight[key] = threading.Event()
+                    break
+            waiter.wait()
+
+        self._refresh(key, fetch)
+        with self._lock:
+            entry = self._items[key]
+        if entry.allowlist is None:
+            raise RuntimeError(entry.error)
+        return entry.allowlist
+
+    def _refresh(self, key: tuple[str, str], fetch: Callable[[], dict]) -> None:
+        repo, release_tag = key
+        try:
+            try:
+                entry = AllowlistEntry(repo, release_tag, fetch(), time.time())
+            except Exception as exc:
+                entry = AllowlistEntry(repo, release_tag, None, time.time(), error=str(exc))
+            with self._lock:
+                current = self._items.get(key)
+                # A failed background refresh keeps serving the stale entry
+                keep_stale = (
+                    entry.allowlist is None
+                    and current is not None
+                    and current.allowlist is not None
+                    and entry.fetched_at - current.fetched_at <= 2 * self._ttl
+                )
+                if not keep_stale:
+                    self._items[key] = entry
+        finally:
+            # Always release waiters, even if storing the result failed
+            with self._lock:
+                self._in_flight.pop(key).set()
+
+
+def _github_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=4, max_retries=Retry(total=3, backoff_factor=0.2))
+    session.mount("https://", adapter)
+    return session
+
+
+# Shared across refreshes so the release lookup and the asset download reuse
+# kept-alive TLS connections instead of handshaking on every fetch
+GITHUB_SESSION = _github_session()
 
 
 def fetch_allowlist(repo: str, release_tag: str, asset_name: str, token: Optional[str]) -> dict:
@@ -47,9 +144,9 @@ def fetch_allowlist(repo: str, release_tag: str, asset_name: str, token: Optiona
     if token:
         headers["Authorization"] = f"Bearer {token}"
 
-    req = Request(release_url, headers=headers)
-    with urlopen(req) as response:
-        release = json.loads(response.read().decode())
+    response = GITHUB_SESSION.get(release_url, headers=headers, timeout=30)
+    response.raise_for_status()
+    release = _loads_json(response.content)
 
     assets = release.get("assets", [])
     asset_url = None
@@ -61,6 +158,7 @@ def fetch_allowlist(repo: str, release_tag: str, asset_name: str, token: Optiona
     if not asset_url:
         raise RuntimeError(f"Allowlist asset not found: {asset_name}")
 
-    req = Request(asset_url, headers=headers)
-    with urlopen(req) as response:
-        return json.loads(response.read().decode())
+    # requests drops Authorization when the download redirects to another host
+    response = GITHUB_SESSION.get(asset_url, headers=headers, timeout=30)
+    response.raise_for_status()
+    return _loads_json(response.content)
@@ -1,7 +1,9 @@
 from __future__ import annotations
 
 import hashlib
+import hmac
 import os
+import re
 import sqlite3
 import threading
 import uuid
@@ -10,6 +12,17 @@ from datetime import datetime, timezone
 from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
 from typing import Optional
 
+INSERT_LEDGER_SQL = """
+    INSERT INTO ledger (entry_id, account_id, delta_cents, reason, ref_type, ref_id, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+UPDATE_LOCK_STATUS_SQL = "UPDATE credit_locks SET status = ? WHERE lock_id = ?"
+UPDATE_USAGE_STATUS_SQL = "UPDATE usage SET status = ? WHERE usage_id = ?"
+APPLY_BALANCE_DELTA_SQL = """
+    UPDATE accounts SET balance_cents = balance_cents + ?, updated_at = ?
+    WHERE account_id = ? AND balance_cents + ? >= 0
+"""
+
 
 class LedgerError(Exception):
     def __init__(self, reason: str) -> None:
@@ -31,9 +44,25 @@ def hash_token(token: str) -> str:
     return hashlib.sha256(token.encode("utf-8")).hexdigest()
 
 
+# Plain non-negative decimals ("12", "3.50", " 0.015 ") take the integer fast path
+_PLAIN_AMOUNT_RE = re.compile(r"\s*([0-9]+)(?:\.([0-9]*))?\s*")
+
+
 def parse_cents(value: object) -> int:
     if value is None:
         raise LedgerError("missing_amount")
+    if type(value) is int:
+        if value < 0:
+            raise LedgerError("invalid_amount")
+        return value * 100
+    match = _PLAIN_AMOUNT_RE.fullmatch(str(value))
+    if match:
+        whole, frac = match.group(1), match.group(2) or ""
+        cents = int(whole) * 100 + int(frac[:2].ljust(2, "0"))
+        # ROUND_HALF_UP: the third fractional digit decides
+        if len(frac) > 2 and frac[2] >= "5":
+            cents += 1
+        return cents
     try:
         amount = Decimal(str(value))
     except (InvalidOperation, ValueError):
@@ -69,6 +98,7 @@ class LedgerStore:
         self._db.row_factory = sqlite3.Row
         self._db.execute("PRAGMA journal_mode=WAL")
         self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.execute("PRAGMA temp_store=MEMORY")
         self._lock = threading.RLock()
         self._ensure_schema()
 
@@ -173,6 +203,16 @@ class LedgerStore:
                 )
                 """
             )
+            # Settlement, eligibility and history lookups seek instead of scanning
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_usage_node_period_status "
+                "ON usage (node_id, period_start, period_end, status)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS idx_node_events_node_time ON node_events (node_id, occurred_at)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_abuse_node_status ON abuse_reports (node_id, status)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_ledger_account ON ledger (account_id, created_at)")
 
     def _fetch_one(self, query: str, params: tuple) -> Optional[sqlite3.Row]:
         return self._db.execute(query, params).fetchone()
@@ -180,30 +220,39 @@ class LedgerStore:
     def _fetch_all(self, query: str, params: tuple = ()) -> list[sqlite3.Row]:
         return self._db.execute(query, params).fetchall()
 
-    def _ensure_account(self, account_id: str) -> None:
-        now = _utcnow()
+    def _fetch_one_tuple(self, query: str, params: tuple) -> Optional[tuple]:
+        cur = self._db.cursor()
+        cur.row_factory = None
+        return cur.execute(query, params).fetchone()
+
+    def _fetch_all_tuples(self, query: str, params: tuple = ()) -> list[tuple]:
+        # Plain tuples for hot loops: sqlite3.Row resolves each name lookup by scanning columns
+        cur = self._db.cursor()
+        cur.row_factory = None
+        return cur.execute(query, params).fetchall()
+
+    def _ensure_account(self, account_id: str, now: Optional[str] = None) -> None:
         row = self._fetch_one("SELECT account_id FROM accounts WHERE account_id = ?", (account_id,))
         if row:
             return
+        now = now or _utcnow()
         self._db.execute(
             "INSERT INTO accounts (account_id, balance_cents, created_at, updated_at) VALUES (?, 0, ?, ?)",
             (account_id, now, now),
         )
 
-    def _apply_balance_delta(self, account_id: str, delta_cents: int) -> None:
-        row = self._fetch_one("SELECT balance_cents FROM accounts WHERE account_id = ?", (account_id,))
-        if not row:
-            self._ensure_account(account_id)
-            row = self._fetch_one("SELECT balance_cents FROM accounts WHERE account_id = ?", (account_id,))
-        current = int(row["balance_cents"])
-        updated = current + delta_cents
-        if updated < 0:
-            raise LedgerError("insufficient_funds")
-        now = _utcnow()
-        self._db.execute(
-            "UPDATE accounts SET balance_cents = ?, updated_at = ? WHERE account_id = ?",
-            (updated, now, account_id),
-        )
+    def _apply_balance_delta(self, account_id: str, delta_cents: int, now: Optional[str] = None) -> None:
+        # SQLite checks the funds and applies the delta in the same statement
+        now = now or _utcnow()
+        params = (delta_cents, now, account_id, delta_cents)
+        if self._db.execute(APPLY_BALANCE_DELTA_SQL, params).rowcount:
+            return
+        # Either the account is missing or the debit would overdraw it; a new
+        # account starts at zero, so only a credit can land after creating it
+        self._ensure_account(account_id, now)
+        if delta_cents >= 0 and self._db.execute(APPLY_BALANCE_DELTA_SQL, params).rowcount:
+            return
+        raise LedgerError("insufficient_funds")
 
     def _insert_ledger_entry(
         self,
@@ -212,23 +261,21 @@ class LedgerStore:
         reason: str,
         ref_type: Optional[str],
         ref_id: Optional[str],
+        now: Optional[str] = None,
     ) -> str:
         entry_id = uuid.uuid4().hex
         self._db.execute(
-            """
-            INSERT INTO ledger (entry_id, account_id, delta_cents, reason, ref_type, ref_id, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,
-            (entry_id, account_id, delta_cents, reason, ref_type, ref_id, _utcnow()),
+            INSERT_LEDGER_SQL,
+            (entry_id, account_id, delta_cents, reason, ref_type, ref_id, now or _utcnow()),
         )
         return entry_id
 
-    def ensure_node(self, node_id: str) -> None:
-        now = _utcnow()
+    def ensure_node(self, node_id: str, now: Optional[str] = None) -> None:
         with self._lock, self._db:
             row = self._fetch_one("SELECT node_id FROM nodes WHERE node_id = ?", (node_id,))
             if row:
                 return
+            now = now or _utcnow()
             self._db.execute(
                 """
                 INSERT INTO nodes (
@@ -238,7 +285,7 @@ class LedgerStore:
                 """,
                 (node_id, now, now),
             )
-            self._ensure_account(node_id)
+            self._ensure_account(node_id, now)
 
     def register_node(
         self,
@@ -296,7 +343,7 @@ class LedgerStore:
                         now,
                     ),
                 )
-                self._ensure_account(node_id)
+                self._ensure_account(node_id, now)
         node = self.get_node(node_id)
         return {"node": node, "node_token": token_value}
 
@@ -307,7 +354,7 @@ class LedgerStore:
             row = self._fetch_one("SELECT node_token_hash FROM nodes WHERE node_id = ?", (node_id,))
             if not row or not row["node_token_hash"]:
                 return False
-            return hash_token(token) == row["node_token_hash"]
+            return hmac.compare_digest(hash_token(token), row["node_token_hash"])
 
     def get_node(self, node_id: str) -> Optional[dict]:
         with self._lock:
@@ -321,7 +368,7 @@ class LedgerStore:
     def update_node_pricing(self, node_id: str, price_cents_per_vcpu_hour: int) -> None:
         now = _utcnow()
         with self._lock, self._db:
-            self.ensure_node(node_id)
+            self.ensure_node(node_id, now)
             self._db.execute(
                 "UPDATE nodes SET price_cents_per_vcpu_hour = ?, updated_at = ? WHERE node_id = ?",
                 (price_cents_per_vcpu_hour, now, node_id),
@@ -330,7 +377,7 @@ class LedgerStore:
     def update_node_stake(self, node_id: str, stake_tier: Optional[str], stake_amount_cents: Optional[int]) -> None:
         now = _utcnow()
         with self._lock, self._db:
-            self.ensure_node(node_id)
+            self.ensure_node(node_id, now)
             self._db.execute(
                 "UPDATE nodes SET stake_tier = ?, stake_amount_cents = ?, updated_at = ? WHERE node_id = ?",
                 (stake_tier, stake_amount_cents, now, node_id),
@@ -339,7 +386,7 @@ class LedgerStore:
     def mark_attestation(self, node_id: str, status: str) -> None:
         now = _utcnow()
         with self._lock, self._db:
-            self.ensure_node(node_id)
+            self.ensure_node(node_id, now)
             self._db.execute(
                 "UPDATE nodes SET attestation_status = ?, last_attested_at = ?, updated_at = ? WHERE node_id = ?",
                 (status, now, now, node_id),
@@ -348,79 +395,46 @@ class LedgerStore:
     def mark_health(self, node_id: str, status: str) -> None:
         now = _utcnow()
         with self._lock, self._db:
-            self.ensure_node(node_id)
+            self.ensure_node(node_id, now)
             self._db.execute(
                 "UPDATE nodes SET health_status = ?, last_health_at = ?, updated_at = ? WHERE node_id = ?",
                 (status, now, now, node_id),
             )
 
     def record_node_event(self, node_id: str, event_type: str, detail: Optional[str]) -> None:
+        now = _utcnow()
         with self._lock, self._db:
-            self.ensure_node(node_id)
+            self.ensure_node(node_id, now)
             self._db.execute(
                 """
                 INSERT INTO node_events (event_id, node_id, event_type, occurred_at, detail)
                 VALUES (?, ?, ?, ?, ?)
                 """,
-                (uuid.uuid4().hex, node_id, event_type, _utcnow(), detail),
+                (uuid.uuid4().hex, node_id, event_type, now, detail),
             )
 
     def purchase_credits(self, account_id: str, amount_cents: int) -> dict:
         if amount_cents <= 0:
             raise LedgerError("invalid_amount")
+        now = _utcnow()
         with self._lock, self._db:
-            self._ensure_account(account_id)
-            self._apply_balance_delta(account_id, amount_cents)
-            self._insert_ledger_entry(account_id, amount_cents, "purchase", "purchase", None)
+            self._ensure_account(account_id, now)
+            self._apply_balance_delta(account_id, amount_cents, now)
+            self._insert_ledger_entry(account_id, amount_cents, "purchase", "purchase", None, now)
         return self.get_balance(account_id)
 
     def transfer_credits(self, from_account: str, to_account: str, amount_cents: int) -> dict:
         if amount_cents <= 0:
             raise LedgerError("invalid_amount")
         transfer_id = uuid.uuid4().hex
+        now = _utcnow()
         with self._lock, self._db:
-            self._apply_balance_delta(from_account, -amount_cents)
-            self._insert_ledger_entry(from_account, -amount_cents, "transfer_out", "transfer", transfer_id)
-            self._apply_balance_delta(to_account, amount_cents)
-            self._insert_ledger_entry(to_account, amount_cents, "transfer_in", "transfer", transfer_id)
+            self._apply_balance_delta(from_account, -amount_cents, now)
+            self._insert_ledger_entry(from_account, -amount_cents, "transfer_out", "transfer", transfer_id, now)
+            self._apply_balance_delta(to_account, amount_cents, now)
+            self._insert_ledger_entry(to_account, amount_cents, "transfer_in", "transfer", transfer_id, now)
         return {"transfer_id": transfer_id}
 
-    def lock_credits(
-        self,
-        account_id: str,
-        usage_id: str,
-        amount_cents: int,
-        period_start: str,
-        period_end: str,
-    ) -> str:
-        lock_id = uuid.uuid4().hex
-        self._apply_balance_delta(account_id, -amount_cents)
-        self._insert_ledger_entry(account_id, -amount_cents, "lock", "usage", usage_id)
-        self._db.execute(
-            """
-            INSERT INTO credit_locks (lock_id, account_id, usage_id, amount_cents, period_start, period_end, status, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, 'locked', ?)
-            """,
-            (lock_id, account_id, usage_id, amount_cents, period_start, period_end, _utcnow()),
-        )
-        return lock_id
-
-    def _release_lock(self, lock_id: str, account_id: str, amount_cents: int, usage_id: str) -> None:
-        self._apply_balance_delta(account_id, amount_cents)
-        self._insert_ledger_entry(account_id, amount_cents, "unlock", "usage", usage_id)
-        self._db.execute(
-            "UPDATE credit_locks SET status = 'released' WHERE lock_id = ?",
-            (lock_id,),
-        )
-
-    def _settle_lock(self, lock_id: str, provider_id: str, amount_cents: int, usage_id: str) -> None:
-        self._apply_balance_delta(provider_id, amount_cents)
-        self._insert_ledger_entry(provider_id, amount_cents, "settlement", "usage", usage_id)
-        self._db.execute(
-            "UPDATE credit_locks SET status = 'settled' WHERE lock_id = ?",
-            (lock_id,),
-        )
-
     def report_usage(
         self,
         account_id: str,
@@ -430,16 +444,32 @@ class LedgerStore:
         period_end: str,
     ) -> dict:
         usage_id = uuid.uuid4().hex
+        lock_id = uuid.uuid4().hex
         with self._lock, self._db:
             node = self._fetch_one("SELECT price_cents_per_vcpu_hour FROM nodes WHERE node_id = ?", (node_id,))
             if not node or node["price_cents_per_vcpu_hour"] is None:
                 raise LedgerError("node_price_missing")
             price_cents = int(node["price_cents_per_vcpu_hour"])
-            amount_cents = int((vcpu_hours * Decimal(price_cents)).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+            # Exact HALF_UP rounding of hours * price in integer math
+            numerator, denominator = vcpu_hours.as_integer_ratio()
+            amount_cents = (2 * numerator * price_cents + denominator) // (2 * denominator)
             if amount_cents <= 0:
                 raise LedgerError("invalid_amount")
-            self._ensure_account(account_id)
-            lock_id = self.lock_credits(account_id, usage_id, amount_cents, period_start, period_end)
+            # Lock the credits and record the usage: one conditional debit (which
+            # also covers a missing account) and one insert per table
+            now = _utcnow()
+            self._apply_balance_delta(account_id, -amount_cents, now)
+            self._db.execute(
+                INSERT_LEDGER_SQL,
+                (uuid.uuid4().hex, account_id, -amount_cents, "lock", "usage", usage_id, now),
+            )
+            self._db.execute(
+                """
+                INSERT INTO credit_locks (lock_id, account_id, usage_id, amount_cents, period_start, period_end, status, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, 'locked', ?)
+                """,
+                (lock_id, account_id, usage_id, amount_cents, period_start, period_end, now),
+            )
             self._db.execute(
                 """
                 INSERT INTO usage (
@@ -457,36 +487,43 @@ class LedgerStore:
                     period_start,
                     period_end,
                     lock_id,
-                    _utcnow(),
+                    now,
                 ),
             )
         return {"usage_id": usage_id, "lock_id": lock_id, "amount_cents": amount_cents}
 
     def _eligible_for_settlement(self, node_id: str, period_start: str, period_end: str) -> NodeEligibility:
         reasons: list[str] = []
-        node = self._fetch_one("SELECT * FROM nodes WHERE node_id = ?", (node_id,))
+        node = self._fetch_one_tuple(
+            """
+            SELECT status, attestation_status, health_status, stake_amount_cents
+            FROM nodes WHERE node_id = ?
+            """,
+            (node_id,),
+        )
         if not node:
             return NodeEligibility(False, ["node_not_found"])
-        if node["status"] != "active":
+        status, attestation_status, health_status, stake_amount_cents = node
+        if status != "active":
             reasons.append("node_inactive")
-        if node["attestation_status"] != "valid":
+        if attestation_status != "valid":
             reasons.append("attestation_invalid")
-        if node["health_status"] != "pass":
+        if health_status != "pass":
             reasons.append("health_fail")
-        if not node["stake_amount_cents"] or int(node["stake_amount_cents"]) <= 0:
+        if not stake_amount_cents or int(stake_amount_cents) <= 0:
             reasons.append("stake_missing")
 
-        events = self._fetch_all(
+        events = self._fetch_all_tuples(
             """
             SELECT event_type FROM node_events
             WHERE node_id = ? AND occurred_at >= ? AND occurred_at <= ?
             """,
             (node_id, period_start, period_end),
         )
-        for event in events:
-            if event["event_type"] == "health_miss":
+        for (event_type,) in events:
+            if event_type == "health_miss":
                 reasons.append("health_miss")
-            if event["event_type"] == "attest_miss":
+            if event_type == "attest_miss":
                 reasons.append("attest_miss")
 
         abuse = self._fetch_one(
@@ -506,28 +543,39 @@ class LedgerStore:
     def settle_period(self, node_id: str, period_start: str, period_end: str) -> dict:
         with self._lock, self._db:
             eligibility = self._eligible_for_settlement(node_id, period_start, period_end)
-            usages = self._fetch_all(
+            usages = self._fetch_all_tuples(
                 """
                 SELECT usage_id, account_id, amount_cents, lock_id FROM usage
                 WHERE node_id = ? AND period_start = ? AND period_end = ? AND status = 'locked'
                 """,
                 (node_id, period_start, period_end),
             )
-            settled = 0
-            failed = 0
-            for usage in usages:
-                usage_id = usage["usage_id"]
-                account_id = usage["account_id"]
-                amount_cents = int(usage["amount_cents"])
-                lock_id = usage["lock_id"]
-                if eligibility.eligible:
-                    self._settle_lock(lock_id, node_id, amount_cents, usage_id)
-                    self._db.execute("UPDATE usage SET status = 'settled' WHERE usage_id = ?", (usage_id,))
-                    settled += 1
-                else:
-                    self._release_lock(lock_id, account_id, amount_cents, usage_id)
-                    self._db.execute("UPDATE usage SET status = 'failed' WHERE usage_id = ?", (usage_id,))
-                    failed += 1
+            # One balance update per account and one executemany per statement,
+            # rather than four statements per usage
+            if eligibility.eligible:
+                reason, lock_status, usage_status = "settlement", "settled", "settled"
+            else:
+                reason, lock_status, usage_status = "unlock", "released", "failed"
+            now = _utcnow()
+            balance_deltas: dict[str, int] = {}
+            ledger_rows = []
+            lock_rows = []
+            usage_rows = []
+            for usage_id, account_id, amount_cents, lock_id in usages:
+                amount_cents = int(amount_cents)
+                payee = node_id if eligibility.eligible else account_id
+                balance_deltas[payee] = balance_deltas.get(payee, 0) + amount_cents
+                ledger_rows.append((uuid.uuid4().hex, payee, amount_cents, reason, "usage", usage_id, now))
+                lock_rows.append((lock_status, lock_id))
+                usage_rows.append((usage_status, usage_id))
+            for account_id, delta_cents in balance_deltas.items():
+                self._apply_balance_delta(account_id, delta_cents, now)
+            if usages:
+                self._db.executemany(INSERT_LEDGER_SQL, ledger_rows)
+                self._db.executemany(UPDATE_LOCK_STATUS_SQL, lock_rows)
+                self._db.executemany(UPDATE_USAGE_STATUS_SQL, usage_rows)
+            settled = len(usages) if eligibility.eligible else 0
+            failed = len(usages) - settled
         return {
             "node_id": node_id,
             "period_start": period_start,
@@ -547,15 +595,16 @@ class LedgerStore:
         reason: Optional[str],
     ) -> dict:
         report_id = uuid.uuid4().hex
+        now = _utcnow()
         with self._lock, self._db:
-            self.ensure_node(node_id)
+            self.ensure_node(node_id, now)
             self._db.execute(
                 """
                 INSERT INTO abuse_reports (
                     report_id, node_id, period_start, period_end, status, reported_by, created_at, reason
                 ) VALUES (?, ?, ?, ?, 'pending', ?, ?, ?)
                 """,
-                (report_id, node_id, period_start, period_end, reported_by, _utcnow(), reason),
+                (report_id, node_id, period_start, period_end, reported_by, now, reason),
             )
         return {"report_id": report_id, "status": "pending"}
 
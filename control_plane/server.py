@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import asyncio
 import base64
+import functools
 import json
 import secrets
 import subprocess
@@ -75,6 +76,7 @@ class Session:
     registered: bool = False
     attesting: bool = False
     pending_proxy: dict[str, asyncio.Future] = field(default_factory=dict)
+    proxy_streams: dict[str, dict] = field(default_factory=dict)
     ratls_result: Optional[RatlsVerifyResult] = None
 
     def info(self) -> dict:
@@ -125,6 +127,8 @@ class ControlPlane:
             async for msg in ws:
                 if msg.type == web.WSMsgType.TEXT:
                     await self._handle_ws_message(session, msg.data)
+                elif msg.type == web.WSMsgType.BINARY:
+                    await self._handle_ws_binary(session, msg.data)
                 elif msg.type == web.WSMsgType.ERROR:
                     break
         finally:
@@ -147,6 +151,12 @@ class ControlPlane:
             await self._handle_attest_response(session, payload)
         elif msg_type == "proxy_response":
             await self._handle_proxy_response(session, payload)
+        elif msg_type == "proxy_response_headers":
+            await self._handle_proxy_response_headers(session, payload)
+        elif msg_type == "proxy_response_chunk":
+            await self._handle_proxy_response_chunk(session, payload)
+        elif msg_type == "proxy_response_end":
+            await self._handle_proxy_response_end(session, payload)
         elif msg_type == "health":
             await self._handle_health(session, payload)
         else:
@@ -179,18 +189,15 @@ class ControlPlane:
                 await session.ws.send_json({"type": "status", "state": "invalid", "reason": "ratls_missing"})
                 await session.ws.close()
                 return
-            allowlist = self.allowlist_cache.get(repo, release_tag)
-            if allowlist is None:
-                try:
-                    allowlist = fetch_allowlist(repo, release_tag, ALLOWLIST_ASSET, GITHUB_TOKEN)
-                    self.allowlist_cache.put(repo, release_tag, allowlist)
-                except Exception as exc:
-                    log(f"allowlist_fetch_failed repo={repo} tag={release_tag} error={exc}")
-                    await session.ws.send_json(
-                        {"type": "status", "state": "invalid", "reason": f"allowlist_fetch_failed:{exc}"}
-                    )
-                    await session.ws.close()
-                    return
+            try:
+                allowlist = await self._load_allowlist(repo, release_tag)
+            except Exception as exc:
+                log(f"allowlist_fetch_failed repo={repo} tag={release_tag} error={exc}")
+                await session.ws.send_json(
+                    {"type": "status", "state": "invalid", "reason": f"allowlist_fetch_failed:{exc}"}
+                )
+                await session.ws.close()
+                return
             ok, reason = match_quote_measurements(allowlist, session.ratls_result.measurements or {})
             if not ok:
                 log(f"ratls_allowlist_mismatch repo={repo} tag={release_tag} reason={reason}")
@@ -264,10 +271,64 @@ class ControlPlane:
         request_id = payload.get("request_id")
         if not request_id:
             return
+        # A plain response ends the request even if a stream was started
+        session.proxy_streams.pop(request_id, None)
         future = session.pending_proxy.pop(request_id, None)
         if future and not future.done():
             future.set_result(payload)
 
+    async def _handle_proxy_response_headers(self, session: Session, payload: dict) -> None:
+        request_id = payload.get("request_id")
+        if not request_id or request_id not in session.pending_proxy:
+            return
+        session.proxy_streams[request_id] = {
+            "status": payload.get("status", 502),
+            "headers": payload.get("headers") or {},
+            "chunks": [],
+        }
+
+    async def _handle_proxy_response_chunk(self, session: Session, payload: dict) -> None:
+        data_b64 = payload.get("data_b64") or ""
+        await self._append_proxy_chunk(
+            session, payload.get("request_id"), payload.get("seq"), base64.b64decode(data_b64.encode("ascii"))
+        )
+
+    async def _handle_ws_binary(self, session: Session, raw: bytes) -> None:
+        # Binary chunk frame: b"<request_id>:<seq>\n" followed by the raw body bytes
+        header, sep, data = raw.partition(b"\n")
+        request_id, _, seq = header.decode("ascii", "replace").rpartition(":")
+        if not sep or not seq.isdigit():
+            await session.ws.send_json({"type": "status", "state": "invalid", "reason": "invalid_binary_frame"})
+            return
+        await self._append_proxy_chunk(session, request_id, int(seq), data)
+
+    async def _append_proxy_chunk(self, session: Session, request_id, seq, data: bytes) -> None:
+        stream = session.proxy_streams.get(request_id)
+        if stream is None:
+            return
+        if seq != len(stream["chunks"]):
+            session.proxy_streams.pop(request_id, None)
+            await self._handle_proxy_response(
+                session, {"request_id": request_id, "status": 502, "headers": {}, "body": b""}
+            )
+            return
+        stream["chunks"].append(data)
+
+    async def _handle_proxy_response_end(self, session: Session, payload: dict) -> None:
+        request_id = payload.get("request_id")
+        stream = session.proxy_streams.pop(request_id, None)
+        if stream is None:
+            return
+        await self._handle_proxy_response(
+            session,
+            {
+                "request_id": request_id,
+                "status": stream["status"],
+                "headers": stream["headers"],
+                "body": b"".join(stream["chunks"]),
+            },
+        )
+
     async def _send_attest_request(self, session: Session, reason: str) -> None:
         if session.attesting:
             return
@@ -313,14 +374,20 @@ class ControlPlane:
                     self.ledger.record_node_event(record.agent_id, "health_miss", "timeout")
                     self.ledger.mark_health(record.agent_id, "fail")
 
+    async def _load_allowlist(self, repo: str, release_tag: str) -> dict:
+        # The cache blocks while fetching, so keep it off the event loop
+        return await asyncio.to_thread(
+            self.allowlist_cache.get_or_fetch,
+            repo,
+            release_tag,
+            functools.partial(fetch_allowlist, repo, release_tag, ALLOWLIST_ASSET, GITHUB_TOKEN),
+        )
+
     async def _verify_session_attestation(self, session: Session, attestation: dict) -> AttestationResult:
-        allowlist = self.allowlist_cache.get(session.repo, session.release_tag)
-        if not allowlist:
-            try:
-                allowlist = fetch_allowlist(session.repo, session.release_tag, ALLOWLIST_ASSET, GITHUB_TOKEN)
-            except Exception as exc:
-                return AttestationResult(False, f"allowlist_fetch_failed:{exc}", False)
-            self.allowlist_cache.put(session.repo, session.release_tag, allowlist)
+        try:
+            allowlist = await self._load_allowlist(session.repo, session.release_tag)
+        except Exception as exc:
+            return AttestationResult(False, f"allowlist_fetch_failed:{exc}", False)
 
         require_sealed = session.network in self._sealed_networks
         result = verify_attestation(attestation, allowlist, require_sealed, PCCS_URL)
@@ -386,6 +453,9 @@ class ControlPlane:
                 "path": path,
                 "headers": headers,
                 "body_b64": base64.b64encode(body).decode("ascii"),
+                # Agents that understand these answer with chunked (binary) frames
+                "stream": True,
+                "binary": True,
             }
         )
 
@@ -393,11 +463,14 @@ class ControlPlane:
             response_payload = await asyncio.wait_for(future, timeout=15)
         except asyncio.TimeoutError:
             session.pending_proxy.pop(request_id, None)
+            session.proxy_streams.pop(request_id, None)
             return _json_error(504, {"allowed": False, "reason": "proxy_timeout"})
 
         status = int(response_payload.get("status", 502))
-        body_b64 = response_payload.get("body_b64") or ""
-        response_body = base64.b64decode(body_b64.encode("ascii")) if body_b64 else b""
+        response_body = response_payload.get("body")
+        if response_body is None:
+            body_b64 = response_payload.get("body_b64") or ""
+            response_body = base64.b64decode(body_b64.encode("ascii")) if body_b64 else b""
         response_headers = response_payload.get("headers") or {}
         return status, response_headers, response_body
 
@@ -0,0 +1,187 @@
+"""Tests for the credit ledger's money paths."""
+from __future__ import annotations
+
+from decimal import ROUND_HALF_UP, Decimal
+
+import pytest
+
+from control_plane.ledger import LedgerError, LedgerStore, parse_cents
+
+PERIOD_START = "2026-01-01T00:00:00"
+PERIOD_END = "2026-01-02T00:00:00"
+
+
+@pytest.fixture
+def store(tmp_path) -> LedgerStore:
+    return LedgerStore(str(tmp_path / "ledger.sqlite"))
+
+
+def _register_eligible_node(store: LedgerStore, node_id: str, price_cents: int) -> None:
+    store.register_node(node_id, price_cents, "gold", 5000, allow_update=False, rotate_token=False)
+    store.mark_attestation(node_id, "valid")
+    store.mark_health(node_id, "pass")
+
+
+def _balance(store: LedgerStore, account_id: str) -> int:
+    return store.get_balance(account_id)["balance_cents"]
+
+
+def _count(store: LedgerStore, table: str) -> int:
+    return store._db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+class TestParseCents:
+    """Tests for amount parsing."""
+
+    @pytest.mark.parametrize(
+        ("value", "expected"),
+        [
+            ("12.345", 1235),
+            ("0.005", 1),
+            (2.675, 268),
+            ("1.004", 100),
+            ("0.015", 2),
+            ("12.3449", 1234),
+            ("10", 1000),
+            (7, 700),
+            ("  4.2 ", 420),
+            ("1e2", 10000),
+        ],
+    )
+    def test_rounds_half_up(self, value, expected):
+        assert parse_cents(value) == expected
+
+    def test_matches_decimal_reference(self):
+        for whole in (0, 1, 12, 999):
+            for frac in range(0, 1000, 7):
+                text = f"{whole}.{frac:03d}"
+                reference = (Decimal(text) * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP)
+                assert parse_cents(text) == int(reference), text
+
+    @pytest.mark.parametrize(
+        ("value", "reason"),
+        [(None, "missing_amount"), (-1, "invalid_amount"), ("-0.01", "invalid_amount"), ("abc", "invalid_amount")],
+    )
+    def test_rejects_invalid(self, value, reason):
+        with pytest.raises(LedgerError) as exc_info:
+            parse_cents(value)
+        assert exc_info.value.reason == reason
+
+
+class TestBalanceDeltas:
+    """Tests for debits that must not go through."""
+
+    def test_overdraft_transfer_is_rejected_without_partial_write(self, store):
+        store.purchase_credits("alice", 1000)
+        ledger_rows = _count(store, "ledger")
+        with pytest.raises(LedgerError) as exc_info:
+            store.transfer_credits("alice", "bob", 1001)
+        assert exc_info.value.reason == "insufficient_funds"
+        assert _balance(store, "alice") == 1000
+        assert _balance(store, "bob") == 0
+        assert _count(store, "ledger") == ledger_rows
+
+    def test_missing_account_debit_is_rejected(self, store):
+        with pytest.raises(LedgerError) as exc_info:
+            store.transfer_credits("ghost", "bob", 1)
+        assert exc_info.value.reason == "insufficient_funds"
+        assert _count(store, "accounts") == 0
+        assert _count(store, "ledger") == 0
+
+    def test_exact_balance_can_be_spent(self, store):
+        store.purchase_credits("alice", 500)
+        store.transfer_credits("alice", "bob", 500)
+        assert _balance(store, "alice") == 0
+        assert _balance(store, "bob") == 500
+
+    def test_usage_without_funds_writes_nothing(self, store):
+        _register_eligible_node(store, "node-1", 100)
+        store.purchase_credits("carol", 50)
+        with pytest.raises(LedgerError) as exc_info:
+            store.report_usage("carol", "node-1", Decimal("1"), PERIOD_START, PERIOD_END)
+        assert exc_info.value.reason == "insufficient_funds"
+        assert _balance(store, "carol") == 50
+        assert _count(store, "usage") == 0
+        assert _count(store, "credit_locks") == 0
+        assert _count(store, "ledger") == 1
+
+
+class TestReportUsage:
+    """Tests for usage pricing."""
+
+    @pytest.mark.parametrize(
+        ("hours", "price_cents", "expected"),
+        [
+            ("0.005", 100, 1),
+            ("0.125", 100, 13),
+            ("0.124", 100, 12),
+            ("12.345", 1, 12),
+            ("0.333", 333, 111),
+            ("1.5", 100, 150),
+        ],
+    )
+    def test_amount_rounds_half_up(self, store, hours, price_cents, expected):
+        _register_eligible_node(store, "node-1", price_cents)
+        store.purchase_credits("alice", 100000)
+        result = store.report_usage("alice", "node-1", Decimal(hours), PERIOD_START, PERIOD_END)
+        reference = (Decimal(hours) * price_cents).quantize(Decimal("1"), rounding=ROUND_HALF_UP)
+        assert result["amount_cents"] == expected == int(reference)
+        assert _balance(store, "alice") == 100000 - expected
+
+    def test_amount_rounding_to_zero_is_rejected(self, store):
+        _register_eligible_node(store, "node-1", 100)
+        store.purchase_credits("alice", 1000)
+        with pytest.raises(LedgerError) as exc_info:
+            store.report_usage("alice", "node-1", Decimal("0.004"), PERIOD_START, PERIOD_END)
+        assert exc_info.value.reason == "invalid_amount"
+        assert _balance(store, "alice") == 1000
+
+
+class TestSettlePeriod:
+    """Tests for batch settlement."""
+
+    def _report(self, store, account_id, node_id, hours):
+        return store.report_usage(account_id, node_id, Decimal(hours), PERIOD_START, PERIOD_END)["amount_cents"]
+
+    def test_eligible_node_is_paid_once(self, store):
+        _register_eligible_node(store, "node-1", 100)
+        store.purchase_credits("alice", 10000)
+        store.purchase_credits("bob", 10000)
+        alice_total = self._report(store, "alice", "node-1", "1.5") + self._report(store, "alice", "node-1", "0.333")
+        bob_total = self._report(store, "bob", "node-1", "2")
+
+        result = store.settle_period("node-1", PERIOD_START, PERIOD_END)
+        assert result["eligible"] is True
+        assert (result["settled"], result["failed"]) == (3, 0)
+        assert _balance(store, "node-1") == alice_total + bob_total
+        assert _balance(store, "alice") == 10000 - alice_total
+        assert _balance(store, "bob") == 10000 - bob_total
+        statuses = store._db.execute("SELECT DISTINCT status FROM usage").fetchall()
+        assert [row[0] for row in statuses] == ["settled"]
+        statuses = store._db.execute("SELECT DISTINCT status FROM credit_locks").fetchall()
+        assert [row[0] for row in statuses] == ["settled"]
+
+        ledger_rows = _count(store, "ledger")
+        again = store.settle_period("node-1", PERIOD_START, PERIOD_END)
+        assert (again["settled"], again["failed"]) == (0, 0)
+        assert _balance(store, "node-1") == alice_total + bob_total
+        assert _balance(store, "alice") == 10000 - alice_total
+        assert _count(store, "ledger") == ledger_rows
+
+    def test_ineligible_node_releases_locks(self, store):
+        store.register_node("node-2", 100, None, None, allow_update=False, rotate_token=False)
+        store.purchase_credits("alice", 10000)
+        self._report(store, "alice", "node-2", "1.5")
+        self._report(store, "alice", "node-2", "0.333")
+
+        result = store.settle_period("node-2", PERIOD_START, PERIOD_END)
+        assert result["eligible"] is False
+        assert (result["settled"], result["failed"]) == (0, 2)
+        assert _balance(store, "alice") == 10000
+        assert _balance(store, "node-2") == 0
+        statuses = store._db.execute("SELECT DISTINCT status FROM credit_locks").fetchall()
+        assert [row[0] for row in statuses] == ["released"]
+
+        again = store.settle_period("node-2", PERIOD_START, PERIOD_END)
+        assert (again["settled"], again["failed"]) == (0, 0)
+        assert _balance(store, "alice") == 10000
@@ -6,21 +6,39 @@ Uses tdvirsh for VM management and trustauthority-cli for quote generation.
 See: https://github.com/canonical/tdx
 """
 
-import hashlib
+import base64
+import functools
 import json
 import os
+import random
 import re
 import shlex
 import shutil
+import stat
 import subprocess
 import sys
-import tempfile
+import threading
 import time
-import urllib.request
+from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import Sequence
 
+try:
+    import orjson
+except ImportError:  # optional: host python may not have it installed
+    orjson = None
+
+try:
+    import libvirt
+except ImportError:  # optional: fall back to the virsh CLI
+    libvirt = None
+
+try:
+    import pycdlib
+except ImportError:  # optional: fall back to genisoimage
+    pycdlib = None
+
 # Force unbuffered output for real-time logging
 sys.stdout.reconfigure(line_buffering=True)
 sys.stderr.reconfigure(line_buffering=True)
@@ -40,18 +58,75 @@ _possible_template_dirs = [
 TEMPLATES_DIR = next((d for d in _possible_template_dirs if d.exists()), _possible_template_dirs[0])
 
 
-def load_template(name: str) -> str:
-    """Load a template file from the templates directory."""
+def loads_json(data: bytes):
+    """Decode a JSON response body straight from bytes (orjson when available)."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def backoff_delay(attempt: int, base: float = 0.2, cap: float = 5.0) -> float:
+    """Exponential backoff with a little jitter for poll loops."""
+    return min(cap, base * 2 ** attempt) + random.uniform(0, 0.1)
+
+
+def run_concurrently(*tasks) -> None:
+    """Run independent callables in parallel, re-raising the first failure."""
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+        futures = [executor.submit(task) for task in tasks]
+        for future in as_completed(futures):
+            future.result()
+
+
+@functools.lru_cache(maxsize=None)
+def _read_template(name: str) -> str:
     return (TEMPLATES_DIR / name).read_text()
 
 
+def load_template(name: str) -> str:
+    """Load a template file from the templates directory (cached).
+
+    Set EE_TEMPLATES_NO_CACHE to re-read templates from disk on every call.
+    """
+    if os.environ.get("EE_TEMPLATES_NO_CACHE"):
+        _read_template.cache_clear()
+    return _read_template(name)
+
+
+HASH_BUFFER_SIZE = 4 * 1024 * 1024
+
+
 def sha256_file(path: str) -> str:
     """Compute sha256 for a file."""
-    h = hashlib.sha256()
-    with open(path, "rb") as f:
-        for chunk in iter(lambda: f.read(1024 * 1024), b""):
-            h.update(chunk)
-    return h.hexdigest()
+    import hashlib
+    with open(path, "rb", buffering=0) as f:
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(f, "sha256").hexdigest()
+        h = hashlib.sha256()
+        buf = bytearray(HASH_BUFFER_SIZE)
+        view = memoryview(buf)
+        while n := f.readinto(buf):
+            h.update(view[:n])
+        return h.hexdigest()
+
+
+def fetch_published_sha256(image_url: str) -> str | None:
+    """Return the sha256 published in the SHA256SUMS file next to image_url."""
+    import urllib.request
+    base_url, filename = image_url.rsplit("/", 1)
+    try:
+        with urllib.request.urlopen(f"{base_url}/SHA256SUMS", timeout=30) as response:
+            sums = response.read().decode()
+    except OSError as exc:
+        log(f"Warning: could not fetch SHA256SUMS for {filename}: {exc}")
+        return None
+    for line in sums.splitlines():
+        parts = line.split()
+        if len(parts) == 2 and parts[1].lstrip("*") == filename:
+            return parts[0].lower()
+    log(f"Warning: {filename} not listed in SHA256SUMS")
+    return None
 
 
 # Default paths (Canonical TDX layout)
@@ -68,6 +143,30 @@ UBUNTU_CLOUD_IMAGES = {
     "24.10": "https://cloud-images.ubuntu.com/oracular/current/oracular-server-cloudimg-amd64.img",
 }
 
+# OVMF firmware candidates (first existing path wins)
+OVMF_PATHS = (
+    "/usr/share/ovmf/OVMF.tdx.fd",
+    "/usr/share/qemu/OVMF.fd",
+    "/usr/share/ovmf/OVMF.fd",
+    "/usr/share/OVMF/OVMF_CODE_4M.fd",
+)
+
+
+def resolve_ovmf_path() -> str:
+    """Return the first installed OVMF firmware path."""
+    return next((p for p in OVMF_PATHS if os.path.exists(p)), OVMF_PATHS[0])
+
+
+OVMF_PATH = resolve_ovmf_path()
+
+
+def refresh_ovmf_path() -> str:
+    """Re-resolve OVMF_PATH (e.g. after installing firmware)."""
+    global OVMF_PATH
+    OVMF_PATH = resolve_ovmf_path()
+    return OVMF_PATH
+
+
 # Deployment state directory
 DEPLOYMENTS_DIR = Path("/var/lib/easy-enclave/deployments")
 PCCS_ENV_VARS = (
@@ -84,6 +183,16 @@ PCCS_CONFIG_PATHS = (
 )
 PCCS_CONFIG_KEYS = ("pccs_url", "collateral_service_url")
 
+# libvirt's dnsmasq lease file for the default network (bridge virbr0)
+DNSMASQ_STATUS_PATH = "/var/lib/libvirt/dnsmasq/virbr0.status"
+LEASE_POLL_INTERVAL = 0.2
+
+# virsh output parsing (domifaddr / net-dhcp-leases / domiflist)
+_IPV4_CIDR_RE = re.compile(r"(\d+\.\d+\.\d+\.\d+)/\d+")
+_TDX_RE = re.compile(r"tdx", re.IGNORECASE)
+_IPTABLES_TOKEN_RE = re.compile(r'"((?:[^"\\]|\\.)*)"|(\S+)')
+_MAC_RE = re.compile(r"\b(?:[0-9a-f]{2}:){5}[0-9a-f]{2}\b", re.IGNORECASE)
+
 
 def _parse_key_value_file(path: str) -> dict[str, str]:
     """Parse simple KEY=VALUE config files."""
@@ -185,37 +294,71 @@ def _check_qgs() -> None:
     log("QGS: running")
 
 
+TDX_PARAM_PATH = "/sys/module/kvm_intel/parameters/tdx"
+
+
+@dataclass(frozen=True)
+class TdxCaps:
+    """Host TDX/libvirt capabilities."""
+
+    kernel: str
+    tdx_enabled: bool
+    libvirt_available: bool
+    libvirt_tdx: bool
+
+
+@functools.lru_cache(maxsize=1)
+def probe_tdx() -> TdxCaps:
+    """Probe host TDX/libvirt support once per process (probe_tdx.cache_clear() to refresh)."""
+    kernel = os.uname().release
+
+    tdx_enabled = False
+    if os.path.exists(TDX_PARAM_PATH):
+        with open(TDX_PARAM_PATH) as f:
+            tdx_enabled = f.read().strip() in ('Y', '1')
+
+    try:
+        libvirt_available = subprocess.run(['virsh', 'version'], capture_output=True, text=True).returncode == 0
+    except FileNotFoundError:
+        libvirt_available = False
+
+    libvirt_tdx = False
+    if libvirt_available:
+        result = subprocess.run(['virsh', 'domcapabilities', '--machine', 'q35'], capture_output=True, text=True)
+        libvirt_tdx = _TDX_RE.search(result.stdout) is not None
+
+    return TdxCaps(
+        kernel=kernel,
+        tdx_enabled=tdx_enabled,
+        libvirt_available=libvirt_available,
+        libvirt_tdx=libvirt_tdx,
+    )
+
+
 def check_requirements() -> None:
     """Check that TDX and libvirt are available. Fails fast if not."""
+    caps = probe_tdx()
+
     # Check kernel
-    result = subprocess.run(['uname', '-r'], capture_output=True, text=True)
-    if result.returncode != 0:
+    if not caps.kernel:
         raise RuntimeError("Cannot get kernel version")
-    kernel = result.stdout.strip()
-    log(f"Kernel: {kernel}")
+    log(f"Kernel: {caps.kernel}")
 
     # Check TDX support
-    tdx_enabled = False
-    tdx_path = "/sys/module/kvm_intel/parameters/tdx"
-    if os.path.exists(tdx_path):
-        with open(tdx_path) as f:
-            if f.read().strip() in ('Y', '1'):
-                tdx_enabled = True
-    if not tdx_enabled:
-        raise RuntimeError(f"TDX not enabled (check {tdx_path})")
+    if not caps.tdx_enabled:
+        raise RuntimeError(f"TDX not enabled (check {TDX_PARAM_PATH})")
     log("TDX: enabled")
 
+    # QGS is a service, so always check its live state
     _check_qgs()
 
     # Check libvirt
-    result = subprocess.run(['virsh', 'version'], capture_output=True, text=True)
-    if result.returncode != 0:
+    if not caps.libvirt_available:
         raise RuntimeError("libvirt not available (virsh not found)")
     log("libvirt: available")
 
     # Check libvirt TDX support
-    result = subprocess.run(['virsh', 'domcapabilities', '--machine', 'q35'], capture_output=True, text=True)
-    if 'tdx' not in result.stdout.lower():
+    if not caps.libvirt_tdx:
         raise RuntimeError("libvirt does not support TDX (check QEMU/libvirt versions)")
     log("libvirt TDX: supported")
 
@@ -232,22 +375,39 @@ def find_existing_images() -> list:
         "/home/ubuntu/tdx/guest-tools/image",
     ]
 
-    patterns = ["*.qcow2", "*.img"]
+    # Suffix order matters: qcow2 images are listed before raw .img per directory
+    suffixes = (".qcow2", ".img")
 
     for search_path in search_paths:
-        if os.path.isdir(search_path):
-            for pattern in patterns:
-                import glob
-                for img in glob.glob(os.path.join(search_path, pattern)):
-                    try:
-                        size = os.path.getsize(img)
-                        images.append({
-                            "path": img,
-                            "size_gb": round(size / (1024**3), 2),
-                            "name": os.path.basename(img),
-                        })
-                    except Exception:
-                        pass
+        try:
+            with os.scandir(search_path) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        # One pass per directory; DirEntry caches the stat result so each
+        # image costs a single stat() call.
+        matches: dict[str, list] = {suffix: [] for suffix in suffixes}
+        for entry in entries:
+            name = entry.name
+            if name.startswith("."):
+                continue
+            suffix = next((s for s in suffixes if name.endswith(s)), None)
+            if suffix is None:
+                continue
+            try:
+                st = entry.stat()
+            except OSError as exc:
+                log(f"Warning: cannot stat {entry.path}: {exc}")
+                continue
+            if not stat.S_ISREG(st.st_mode):
+                continue
+            matches[suffix].append({
+                "path": entry.path,
+                "size_gb": round(st.st_size / (1024**3), 2),
+                "name": name,
+            })
+        for suffix in suffixes:
+            images.extend(matches[suffix])
 
     return images
 
@@ -317,6 +477,92 @@ def build_td_image_from_repo(
     return find_latest_td_image(image_dir, version)
 
 
+DOWNLOAD_CHUNK_SIZE = 64 * 1024 * 1024
+DOWNLOAD_WORKERS = 8
+
+
+def download_file(url: str, dest_path: str) -> None:
+    """
+    Download url to dest_path, using parallel HTTP Range requests when supported.
+
+    Chunks are pwrite()n into a preallocated file; servers that ignore Range
+    (200 instead of 206) fall back to a single stream. The file is written to
+    dest_path + ".part" and renamed into place once complete.
+    """
+    import threading
+    import urllib.request
+    from concurrent.futures import ThreadPoolExecutor
+
+    part_path = dest_path + ".part"
+    total_size = 0
+    accepts_ranges = False
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, method="HEAD"), timeout=30) as response:
+            total_size = int(response.headers.get("Content-Length") or 0)
+            accepts_ranges = response.headers.get("Accept-Ranges", "").lower() == "bytes"
+    except Exception as exc:
+        log(f"Warning: HEAD {url} failed ({exc}); using a single stream")
+
+    done = 0
+    done_lock = threading.Lock()
+
+    def report(nbytes: int) -> None:
+        nonlocal done
+        with done_lock:
+            done += nbytes
+            if total_size:
+                print(f"\rProgress: {int(done * 100 / total_size)}%", end='', flush=True, file=sys.stderr)
+
+    def single_stream() -> None:
+        with urllib.request.urlopen(url, timeout=60) as response, open(part_path, "wb") as f:
+            for chunk in iter(lambda: response.read(1024 * 1024), b""):
+                f.write(chunk)
+                report(len(chunk))
+
+    if not accepts_ranges or total_size <= DOWNLOAD_CHUNK_SIZE:
+        single_stream()
+        os.replace(part_path, dest_path)
+        return
+
+    class RangeNotSupported(Exception):
+        pass
+
+    fd = os.open(part_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        try:
+            os.posix_fallocate(fd, 0, total_size)
+        except (AttributeError, OSError):
+            os.ftruncate(fd, total_size)
+
+        def fetch_range(start: int) -> None:
+            end = min(start + DOWNLOAD_CHUNK_SIZE, total_size) - 1
+            req = urllib.request.Request(url, headers={"Range": f"bytes={start}-{end}"})
+            with urllib.request.urlopen(req, timeout=60) as response:
+                if response.status != 206:
+                    raise RangeNotSupported(f"HTTP {response.status}")
+                offset = start
+                for chunk in iter(lambda: response.read(1024 * 1024), b""):
+                    os.pwrite(fd, chunk, offset)
+                    offset += len(chunk)
+                    report(len(chunk))
+            if offset != end + 1:
+                raise RuntimeError(f"Short read for bytes {start}-{end}")
+
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+            for future in [executor.submit(fetch_range, start) for start in range(0, total_size, DOWNLOAD_CHUNK_SIZE)]:
+                future.result()
+    except RangeNotSupported:
+        os.close(fd)
+        fd = -1
+        log("\nServer ignored Range requests; retrying as a single stream")
+        done = 0
+        single_stream()
+    finally:
+        if fd >= 0:
+            os.close(fd)
+    os.replace(part_path, dest_path)
+
+
 def download_ubuntu_image(version: str = "24.04", dest_dir: str = IMAGE_DIR) -> str:
     """
     Download Ubuntu cloud image if not present.
@@ -340,14 +586,36 @@ def download_ubuntu_image(version: str = "24.04", dest_dir: str = IMAGE_DIR) ->
     log(f"URL: {url}")
     log(f"Destination: {dest_path}")
 
-    # Download with progress
-    def reporthook(count, block_size, total_size):
-        percent = int(count * block_size * 100 / total_size)
-        print(f"\rProgress: {percent}%", end='', flush=True, file=sys.stderr)
-
-    urllib.request.urlretrieve(url, dest_path, reporthook)
+    # Download with progress, preferring native multi-connection downloaders
+    part_path = dest_path + ".part"
+    if shutil.which("aria2c"):
+        subprocess.run([
+            'aria2c', '-x', '8', '-s', '8', '-k', '16M',
+            '--summary-interval=1', '--console-log-level=warn',
+            '--allow-overwrite=true', '--auto-file-renaming=false',
+            '-d', os.path.dirname(part_path), '-o', os.path.basename(part_path), url,
+        ], check=True, stdout=sys.stderr)
+    elif shutil.which("curl"):
+        subprocess.run(
+            ['curl', '-fL', '--retry', '3', '-#', '-o', part_path, url],
+            check=True,
+            stdout=sys.stderr,
+        )
+    else:
+        download_file(url, part_path)
     log("\nDownload complete!")
 
+    expected_sha256 = fetch_published_sha256(url)
+    if expected_sha256:
+        actual_sha256 = sha256_file(part_path)
+        if actual_sha256 != expected_sha256:
+            os.unlink(part_path)
+            raise RuntimeError(
+                f"Checksum mismatch for {filename}: expected {expected_sha256}, got {actual_sha256}"
+            )
+        log(f"Checksum verified: sha256 {actual_sha256}")
+    os.replace(part_path, dest_path)
+
     # Convert to qcow2 if needed
     if dest_path.endswith('.img'):
         qcow2_path = dest_path.replace('.img', '.qcow2')
@@ -433,6 +701,69 @@ def build_extra_files_yaml(extra_files: list[dict[str, str]] | None) -> str:
     return "\n".join(blocks)
 
 
+def write_seed_file(path: str, content: str) -> None:
+    """Write a small cloud-init seed file in one write, created world-readable."""
+    data = content.encode()
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+        os.fchmod(fd, 0o644)
+    finally:
+        os.close(fd)
+
+
+# cloud-init seed files: (Joliet/Rock Ridge name, ISO9660 level-1 name)
+CIDATA_FILES = (
+    ("user-data", "USERDATA.;1"),
+    ("meta-data", "METADATA.;1"),
+    ("network-config", "NETWORKC.;1"),
+)
+
+
+def create_cidata_iso(workdir: str, user_data: str, meta_data: str, network_config: str) -> str:
+    """Pack the cloud-init seed files into workdir/cidata.iso.
+
+    Built in-process with pycdlib when it is installed; otherwise the seed
+    files are written out and packed with genisoimage.
+    """
+    import io
+    cidata_iso = os.path.join(workdir, "cidata.iso")
+    contents = (user_data, meta_data, network_config)
+
+    if pycdlib is not None:
+        iso = pycdlib.PyCdlib()
+        iso.new(interchange_level=3, joliet=3, rock_ridge="1.09", vol_ident="cidata")
+        for (name, iso_name), content in zip(CIDATA_FILES, contents):
+            data = content.encode()
+            iso.add_fp(io.BytesIO(data), len(data), f"/{iso_name}", rr_name=name, joliet_path=f"/{name}")
+        iso.write(cidata_iso)
+        iso.close()
+        os.chmod(cidata_iso, 0o644)
+        return cidata_iso
+
+    paths = []
+    for (name, _), content in zip(CIDATA_FILES, contents):
+        path = os.path.join(workdir, name)
+        write_seed_file(path, content)
+        paths.append(path)
+
+    subprocess.run([
+        'genisoimage', '-output', cidata_iso,
+        '-volid', 'cidata', '-joliet', '-rock',
+        *paths,
+    ], check=True, capture_output=True)
+    os.chmod(cidata_iso, 0o644)
+    return cidata_iso
+
+
+@functools.lru_cache(maxsize=None)
+def get_quote_yaml() -> str:
+    """Return get-quote.py pre-indented for the user-data write_files block."""
+    return indent_yaml(load_template("get-quote.py"), 6)
+
+
 def create_workload_image(
     base_image: str,
     docker_compose_content: str,
@@ -445,21 +776,14 @@ def create_workload_image(
 
     Returns path to the new image.
     """
+    import tempfile
     workdir = tempfile.mkdtemp(prefix="ee-workload-")
     # Make workdir world-readable so libvirt/QEMU can access it
     os.chmod(workdir, 0o755)
     workload_image = os.path.join(workdir, "workload.qcow2")
 
-    # Create overlay image (don't specify size - inherit from base)
-    subprocess.run([
-        'qemu-img', 'create', '-f', 'qcow2',
-        '-b', base_image, '-F', 'qcow2',
-        workload_image
-    ], check=True, capture_output=True)
-
     # Load templates
     start_sh = load_template("start.sh").replace("{port}", str(port))
-    get_quote = load_template("get-quote.py")
     network_config = load_template("network-config.yml")
 
     # SSH config (off by default)
@@ -475,28 +799,31 @@ ssh_pwauth: false
         ssh_config=ssh_config,
         docker_compose=indent_yaml(docker_compose_content, 6),
         start_sh=indent_yaml(start_sh, 6),
-        get_quote=indent_yaml(get_quote, 6),
+        get_quote=get_quote_yaml(),
         extra_files=extra_files_yaml,
     )
 
-    user_data_path = os.path.join(workdir, "user-data")
-    meta_data_path = os.path.join(workdir, "meta-data")
-    network_config_path = os.path.join(workdir, "network-config")
+    cidata_iso = os.path.join(workdir, "cidata.iso")
 
-    with open(user_data_path, 'w') as f:
-        f.write(user_data)
-    with open(meta_data_path, 'w') as f:
-        f.write("instance-id: ee-workload\nlocal-hostname: ee-workload\n")
-    with open(network_config_path, 'w') as f:
-        f.write(network_config)
+    def create_overlay() -> None:
+        # Create overlay image (don't specify size - inherit from base)
+        subprocess.run([
+            'qemu-img', 'create', '-f', 'qcow2',
+            '-b', base_image, '-F', 'qcow2',
+            workload_image
+        ], check=True, capture_output=True)
+
+    def create_cidata() -> None:
+        # Create cloud-init ISO
+        create_cidata_iso(
+            workdir,
+            user_data,
+            "instance-id: ee-workload\nlocal-hostname: ee-workload\n",
+            network_config,
+        )
 
-    # Create cloud-init ISO
-    cidata_iso = os.path.join(workdir, "cidata.iso")
-    subprocess.run([
-        'genisoimage', '-output', cidata_iso,
-        '-volid', 'cidata', '-joliet', '-rock',
-        user_data_path, meta_data_path, network_config_path
-    ], check=True, capture_output=True)
+    # The overlay and the cloud-init ISO don't depend on each other
+    run_concurrently(create_overlay, create_cidata)
 
     # Make all files accessible by libvirt/QEMU (qcow2 needs write access)
     for f in os.listdir(workdir):
@@ -572,16 +899,11 @@ def create_agent_image(
     user_data_template: str = "agent-user-data.yml",
 ) -> str:
     """Create an agent VM image with agent service installed."""
+    import tempfile
     workdir = tempfile.mkdtemp(prefix="ee-agent-")
     os.chmod(workdir, 0o755)
     agent_image = os.path.join(workdir, "agent.qcow2")
 
-    subprocess.run([
-        'qemu-img', 'create', '-f', 'qcow2',
-        '-b', base_image, '-F', 'qcow2',
-        agent_image
-    ], check=True, capture_output=True)
-
     agent_service = load_template("agent-service.service").format(agent_port=agent_port)
     network_config = load_template("network-config.yml")
     vm_image_id = build_vm_image_id_yaml(vm_image_tag, vm_image_sha256)
@@ -614,23 +936,24 @@ def create_agent_image(
         vm_image_id=vm_image_id,
     )
 
-    user_data_path = os.path.join(workdir, "user-data")
-    meta_data_path = os.path.join(workdir, "meta-data")
-    network_config_path = os.path.join(workdir, "network-config")
+    cidata_iso = os.path.join(workdir, "cidata.iso")
 
-    with open(user_data_path, 'w') as f:
-        f.write(user_data)
-    with open(meta_data_path, 'w') as f:
-        f.write("instance-id: ee-agent\nlocal-hostname: ee-agent\n")
-    with open(network_config_path, 'w') as f:
-        f.write(network_config)
+    def create_overlay() -> None:
+        subprocess.run([
+            'qemu-img', 'create', '-f', 'qcow2',
+            '-b', base_image, '-F', 'qcow2',
+            agent_image
+        ], check=True, capture_output=True)
+
+    def create_cidata() -> None:
+        create_cidata_iso(
+            workdir,
+            user_data,
+            "instance-id: ee-agent\nlocal-hostname: ee-agent\n",
+            network_config,
+        )
 
-    cidata_iso = os.path.join(workdir, "cidata.iso")
-    subprocess.run([
-        'genisoimage', '-output', cidata_iso,
-        '-volid', 'cidata', '-joliet', '-rock',
-        user_data_path, meta_data_path, network_config_path
-    ], check=True, capture_output=True)
+    run_concurrently(create_overlay, create_cidata)
 
     for f in os.listdir(workdir):
         filepath = os.path.join(workdir, f)
@@ -773,9 +1096,6 @@ def create_minimal_cidata(
     """Create a minimal cloud-init ISO for networking/metadata."""
     os.makedirs(workdir, exist_ok=True)
     os.chmod(workdir, 0o755)
-    user_data_path = os.path.join(workdir, "user-data")
-    meta_data_path = os.path.join(workdir, "meta-data")
-    network_config_path = os.path.join(workdir, "network-config")
 
     user_data = "#cloud-config\n"
     route_cmd = (
@@ -820,24 +1140,12 @@ def create_minimal_cidata(
             user_data += "  - systemctl restart nginx || true\n"
     else:
         user_data += "runcmd:\n" f"{route_cmd}"
-    with open(user_data_path, "w") as f:
-        f.write(user_data)
-    with open(meta_data_path, "w") as f:
-        f.write(f"instance-id: {hostname}\nlocal-hostname: {hostname}\n")
-    with open(network_config_path, "w") as f:
-        f.write(load_template("network-config.yml"))
-
-    for path in (user_data_path, meta_data_path, network_config_path):
-        os.chmod(path, 0o644)
-
-    cidata_iso = os.path.join(workdir, "cidata.iso")
-    subprocess.run([
-        "genisoimage", "-output", cidata_iso,
-        "-volid", "cidata", "-joliet", "-rock",
-        user_data_path, meta_data_path, network_config_path
-    ], check=True, capture_output=True)
-    os.chmod(cidata_iso, 0o644)
-    return cidata_iso
+    return create_cidata_iso(
+        workdir,
+        user_data,
+        f"instance-id: {hostname}\nlocal-hostname: {hostname}\n",
+        load_template("network-config.yml"),
+    )
 
 
 def start_agent_vm_from_image(
@@ -852,6 +1160,7 @@ def start_agent_vm_from_image(
     control_plane_enabled: bool = False,
 ) -> dict:
     """Start an agent VM from a pre-baked image."""
+    import tempfile
     log("Checking requirements...")
     check_requirements()
 
@@ -950,17 +1259,33 @@ def wait_for_vm_shutdown(name: str, timeout: int = 1200) -> None:
     raise TimeoutError(f"Timed out waiting for {name} to shut down")
 
 
+def read_last_lines(path: Path, lines: int, block_size: int = 64 * 1024) -> list[str]:
+    """Read the last N lines of a file without scanning it from the start."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        data = b""
+        while pos > 0 and data.count(b"\n") <= lines:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+    return data.decode(errors="replace").splitlines()[-lines:]
+
+
 def log_serial_tail(name: str, lines: int = 200) -> None:
     path = Path(f"/var/log/libvirt/qemu/{name}-serial.log")
     if not path.exists():
         log(f"No serial log found at {path}")
         return
     try:
-        content = path.read_text(errors="replace").splitlines()
+        if lines > 0:
+            tail_lines = read_last_lines(path, lines)
+        else:
+            tail_lines = path.read_text(errors="replace").splitlines()
     except Exception as exc:
         log(f"Failed to read serial log: {exc}")
         return
-    tail_lines = content[-lines:] if lines > 0 else content
     if not tail_lines:
         log("Serial log is empty")
         return
@@ -969,10 +1294,148 @@ def log_serial_tail(name: str, lines: int = 200) -> None:
         log(line)
 
 
+LIBVIRT_URI = "qemu:///system"
+
+
+@functools.lru_cache(maxsize=1)
+def libvirt_connection():
+    """Return a cached libvirt connection, or None to fall back to sudo virsh."""
+    if libvirt is None:
+        return None
+    libvirt.registerErrorHandler(lambda _ctx, _err: None, None)
+    try:
+        return libvirt.open(LIBVIRT_URI)
+    except libvirt.libvirtError as exc:
+        log(f"libvirt API unavailable ({exc}); using virsh")
+        return None
+
+
+def vm_exists(name: str) -> bool:
+    """Return True if a domain with this name is defined."""
+    conn = libvirt_connection()
+    if conn is None:
+        result = subprocess.run(['sudo', 'virsh', 'domstate', name], capture_output=True, text=True)
+        return result.returncode == 0
+    try:
+        conn.lookupByName(name)
+    except libvirt.libvirtError:
+        return False
+    return True
+
+
+def list_vm_names() -> list[str] | None:
+    """Return all defined domain names, or None if they could not be listed."""
+    conn = libvirt_connection()
+    if conn is not None:
+        return [dom.name() for dom in conn.listAllDomains()]
+    result = subprocess.run(
+        ['sudo', 'virsh', 'list', '--all', '--name'],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        log(f"Warning: failed to list VMs: {result.stderr.strip()}")
+        return None
+    return [line.strip() for line in result.stdout.splitlines() if line.strip()]
+
+
+def define_and_start_vm(name: str, vm_xml: str, xml_path: str) -> None:
+    """Define the domain from XML and start it."""
+    conn = libvirt_connection()
+    if conn is not None:
+        try:
+            dom = conn.defineXML(vm_xml)
+        except libvirt.libvirtError as exc:
+            log(f"virsh define failed: {exc}")
+            raise RuntimeError(f"Failed to define VM: {exc}") from exc
+        try:
+            dom.create()
+        except libvirt.libvirtError as exc:
+            log(f"virsh start failed: {exc}")
+            raise RuntimeError(f"Failed to start VM: {exc}") from exc
+        return
+
+    # Define and start under one sudo; exit code tells us which step failed
+    script = (
+        f"virsh define {shlex.quote(xml_path)} || exit 10; "
+        f"virsh start {shlex.quote(name)} || exit 11"
+    )
+    result = subprocess.run(['sudo', 'sh', '-c', script], capture_output=True, text=True)
+    if result.returncode == 11:
+        log(f"virsh start failed: {result.stderr}")
+        raise RuntimeError(f"Failed to start VM: {result.stderr}")
+    if result.returncode != 0:
+        log(f"virsh define failed: {result.stderr}")
+        raise RuntimeError(f"Failed to define VM: {result.stderr}")
+
+
+def libvirt_vm_ipv4(name: str) -> str:
+    """Return the VM's IPv4 via the guest agent or DHCP lease, "" if unknown."""
+    conn = libvirt_connection()
+    if conn is None:
+        return ""
+    try:
+        dom = conn.lookupByName(name)
+    except libvirt.libvirtError:
+        return ""
+    for source in (
+        libvirt.VIR_DOMAIN_INTERFACE_ADDRESSES_SRC_AGENT,
+        libvirt.VIR_DOMAIN_INTERFACE_ADDRESSES_SRC_LEASE,
+    ):
+        try:
+            interfaces = dom.interfaceAddresses(source)
+        except libvirt.libvirtError:
+            continue
+        for iface in interfaces.values():
+            for addr in iface.get("addrs") or []:
+                ip = addr.get("addr", "")
+                if addr.get("type") == libvirt.VIR_IP_ADDR_TYPE_IPV4 and ip and not ip.startswith("127."):
+                    return ip
+    return ""
+
+
+# virsh undefine flags with a direct libvirt equivalent
+_UNDEFINE_FLAGS = {"--nvram": "VIR_DOMAIN_UNDEFINE_NVRAM"}
+
+
+def virsh_destroy_undefine(name: str, *undefine_flags: str) -> None:
+    """Destroy and undefine a VM (errors ignored).
+
+    Uses the libvirt API when available; otherwise a single sudo invocation of
+    virsh. --remove-all-storage has no undefineFlags equivalent, so it always
+    goes through virsh.
+    """
+    conn = libvirt_connection()
+    if conn is not None and all(flag in _UNDEFINE_FLAGS for flag in undefine_flags):
+        try:
+            dom = conn.lookupByName(name)
+        except libvirt.libvirtError:
+            return
+        try:
+            dom.destroy()
+        except libvirt.libvirtError:
+            pass
+        flags = 0
+        for flag in undefine_flags:
+            flags |= getattr(libvirt, _UNDEFINE_FLAGS[flag])
+        try:
+            dom.undefineFlags(flags)
+        except libvirt.libvirtError:
+            pass
+        return
+
+    quoted = shlex.quote(name)
+    flags = "".join(f" {shlex.quote(flag)}" for flag in undefine_flags)
+    script = (
+        f"virsh destroy {quoted} >/dev/null 2>&1; "
+        f"virsh undefine {quoted}{flags} >/dev/null 2>&1; true"
+    )
+    subprocess.run(['sudo', 'sh', '-c', script], capture_output=True)
+
+
 def cleanup_vm_definition(name: str) -> None:
     """Remove VM definition without deleting disk."""
-    subprocess.run(['sudo', 'virsh', 'destroy', name], capture_output=True)
-    subprocess.run(['sudo', 'virsh', 'undefine', name, '--nvram'], capture_output=True)
+    virsh_destroy_undefine(name, '--nvram')
 
 
 def build_pristine_agent_image(
@@ -1100,9 +1563,9 @@ def build_pristine_agent_image(
     }
 
 def indent_yaml(content: str, spaces: int) -> str:
-    """Indent YAML content."""
-    indent = ' ' * spaces
-    return '\n'.join(indent + line for line in content.split('\n'))
+    """Indent YAML content, including blank lines."""
+    import textwrap
+    return textwrap.indent(content, ' ' * spaces, lambda _: True)
 
 
 def start_td_vm(
@@ -1117,6 +1580,7 @@ def start_td_vm(
 
     Returns the VM's IP address.
     """
+    import tempfile
     # Check for tdvirsh (Canonical tool)
     tdvirsh = os.path.expanduser("~/tdx/guest-tools/run_td.sh")
     if not os.path.exists(tdvirsh):
@@ -1131,29 +1595,18 @@ def start_td_vm(
 
     # Clean up existing VM thoroughly
     log(f"Cleaning up existing VM {name}...")
-    subprocess.run(['sudo', 'virsh', 'destroy', name], capture_output=True)
-    subprocess.run(['sudo', 'virsh', 'undefine', name, '--nvram'], capture_output=True)
+    virsh_destroy_undefine(name, '--nvram')
 
     # Wait a moment for cleanup
     time.sleep(1)
 
     # Verify cleanup
-    check = subprocess.run(['sudo', 'virsh', 'domstate', name], capture_output=True, text=True)
-    if check.returncode == 0:
+    if vm_exists(name):
         log(f"Warning: VM {name} still exists, forcing undefine...")
         subprocess.run(['sudo', 'virsh', 'undefine', name, '--nvram', '--remove-all-storage'], capture_output=True)
         time.sleep(1)
 
-    # Define and start
-    result = subprocess.run(['sudo', 'virsh', 'define', xml_path], capture_output=True, text=True)
-    if result.returncode != 0:
-        log(f"virsh define failed: {result.stderr}")
-        raise RuntimeError(f"Failed to define VM: {result.stderr}")
-
-    result = subprocess.run(['sudo', 'virsh', 'start', name], capture_output=True, text=True)
-    if result.returncode != 0:
-        log(f"virsh start failed: {result.stderr}")
-        raise RuntimeError(f"Failed to start VM: {result.stderr}")
+    define_and_start_vm(name, vm_xml, xml_path)
 
     log(f"VM {name} started successfully")
 
@@ -1186,11 +1639,17 @@ def start_td_vm(
     # Try to get console log to see boot status
     log("=== Checking VM console/serial log ===")
     try:
-        # Check qemu log if available
-        result = subprocess.run(['sudo', 'cat', f'/var/log/libvirt/qemu/{name}.log'],
-                               capture_output=True, text=True)
-        if result.returncode == 0 and result.stdout.strip():
-            lines = result.stdout.strip().split('\n')
+        # Check qemu log if available; only shell out to sudo when we can't read it directly
+        qemu_log = Path(f'/var/log/libvirt/qemu/{name}.log')
+        try:
+            qemu_log_text = qemu_log.read_text(errors="replace")
+        except PermissionError:
+            result = subprocess.run(['sudo', 'cat', str(qemu_log)], capture_output=True, text=True)
+            qemu_log_text = result.stdout if result.returncode == 0 else ""
+        except FileNotFoundError:
+            qemu_log_text = ""
+        if qemu_log_text.strip():
+            lines = qemu_log_text.strip().split('\n')
             log("Last 10 lines of QEMU log:")
             for line in lines[-10:]:
                 log(f"  {line}")
@@ -1210,37 +1669,90 @@ def generate_tdx_domain_xml(
     vcpus: int,
 ) -> str:
     """Generate libvirt XML for TDX VM based on Canonical's template."""
-    ovmf_paths = [
-        "/usr/share/ovmf/OVMF.tdx.fd",
-        "/usr/share/qemu/OVMF.fd",
-        "/usr/share/ovmf/OVMF.fd",
-        "/usr/share/OVMF/OVMF_CODE_4M.fd",
-    ]
-    ovmf = next((p for p in ovmf_paths if os.path.exists(p)), ovmf_paths[0])
+    from xml.sax.saxutils import escape
+    ovmf = OVMF_PATH
     log(f"Using OVMF firmware: {ovmf}")
 
+    # Values land in element text and single-quoted attributes
+    entities = {"'": "&apos;", '"': "&quot;"}
     return load_template("domain.xml").format(
-        name=name,
-        memory_mb=memory_mb,
-        vcpus=vcpus,
-        ovmf=ovmf,
-        disk_path=disk_path,
-        cidata_iso=cidata_iso,
+        name=escape(name, entities),
+        memory_mb=int(memory_mb),
+        vcpus=int(vcpus),
+        ovmf=escape(ovmf, entities),
+        disk_path=escape(disk_path, entities),
+        cidata_iso=escape(cidata_iso, entities),
     )
 
 
 def get_vm_mac(name: str) -> str:
     """Get the MAC address of a VM's network interface."""
-    result = subprocess.run(
-        ['sudo', 'virsh', 'domiflist', name],
-        capture_output=True, text=True
-    )
-    for line in result.stdout.split('\n'):
-        # Look for lines with MAC addresses (format: 52:54:00:xx:xx:xx)
-        parts = line.split()
-        for part in parts:
-            if ':' in part and len(part) == 17 and part.count(':') == 5:
-                return part.lower()
+    conn = libvirt_connection()
+    if conn is not None:
+        try:
+            output = conn.lookupByName(name).XMLDesc()
+        except libvirt.libvirtError:
+            output = ""
+    else:
+        output = subprocess.run(
+            ['sudo', 'virsh', 'domiflist', name],
+            capture_output=True, text=True
+        ).stdout
+    # Look for MAC addresses (format: 52:54:00:xx:xx:xx)
+    match = _MAC_RE.search(output)
+    return match.group(0).lower() if match else ""
+
+
+def read_dnsmasq_lease(mac: str, status_path: str = DNSMASQ_STATUS_PATH) -> str:
+    """Return the unexpired IPv4 lease for mac from libvirt's dnsmasq status file."""
+    try:
+        with open(status_path, "rb") as f:
+            leases = loads_json(f.read() or b"[]")
+    except (OSError, ValueError):
+        return ""
+    now = time.time()
+    for lease in leases:
+        if lease.get("mac-address", "").lower() != mac:
+            continue
+        if lease.get("expiry-time", now) < now:
+            continue
+        ip = lease.get("ip-address", "")
+        if ip and ":" not in ip:
+            return ip
+    return ""
+
+
+def wait_for_dnsmasq_lease(mac: str, duration: float, status_path: str = DNSMASQ_STATUS_PATH) -> str:
+    """
+    Watch the dnsmasq status file for up to duration seconds.
+
+    The file is only re-parsed when its mtime changes; returns the lease IP as
+    soon as one appears, or "" when the time is up (or the file is absent).
+    """
+    deadline = time.monotonic() + duration
+    last_mtime = None
+    while True:
+        try:
+            mtime = os.stat(status_path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime is not None and mtime != last_mtime:
+            last_mtime = mtime
+            ip = read_dnsmasq_lease(mac, status_path)
+            if ip:
+                return ip
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return ""
+        time.sleep(min(LEASE_POLL_INTERVAL, remaining))
+
+
+def _find_ipv4(output: str, prefix: str = "") -> str:
+    """Return the first non-loopback IPv4 address in CIDR form from virsh output."""
+    for match in _IPV4_CIDR_RE.finditer(output):
+        ip = match.group(1)
+        if not ip.startswith("127.") and ip.startswith(prefix):
+            return ip
     return ""
 
 
@@ -1248,6 +1760,7 @@ def wait_for_vm_ip(name: str, timeout: int = 300) -> str:
     """Wait for VM to get an IP address."""
     start = time.time()
     last_print = 0
+    attempt = 0
 
     # Get the VM's MAC address first
     vm_mac = get_vm_mac(name)
@@ -1256,6 +1769,18 @@ def wait_for_vm_ip(name: str, timeout: int = 300) -> str:
     else:
         log("Warning: Could not get VM MAC address")
 
+    use_libvirt = libvirt_connection() is not None
+
+    def pause() -> str:
+        """Back off between probes, watching the lease file in the meantime."""
+        nonlocal attempt
+        delay = backoff_delay(attempt, cap=10.0)
+        attempt += 1
+        if vm_mac:
+            return wait_for_dnsmasq_lease(vm_mac, delay)
+        time.sleep(delay)
+        return ""
+
     while time.time() - start < timeout:
         elapsed = int(time.time() - start)
         if elapsed - last_print >= 30:
@@ -1271,18 +1796,28 @@ def wait_for_vm_ip(name: str, timeout: int = 300) -> str:
                     for lease_line in lease_lines[:3]:
                         log(f"    {lease_line.strip()}")
 
+        # dnsmasq's lease file answers without spawning anything
+        ip = read_dnsmasq_lease(vm_mac) if vm_mac else ""
+        if ip:
+            log(f"Found IP {ip} for VM {name} in dnsmasq leases (MAC: {vm_mac})")
+            return ip
+
+        if use_libvirt:
+            # Guest agent first, then the DHCP lease keyed to this domain's MAC
+            ip = libvirt_vm_ipv4(name) or pause()
+            if ip:
+                return ip
+            continue
+
         # Try virsh domifaddr with agent
         try:
             result = subprocess.run(
                 ['sudo', 'virsh', 'domifaddr', name, '--source', 'agent'],
                 capture_output=True, text=True, timeout=10
             )
-            for line in result.stdout.split('\n'):
-                if 'ipv4' in line.lower():
-                    parts = line.split()
-                    for part in parts:
-                        if '/' in part and '.' in part:
-                            return part.split('/')[0]
+            ip = _find_ipv4(result.stdout)
+            if ip:
+                return ip
         except Exception:
             pass
 
@@ -1292,11 +1827,9 @@ def wait_for_vm_ip(name: str, timeout: int = 300) -> str:
                 ['sudo', 'virsh', 'domifaddr', name],
                 capture_output=True, text=True, timeout=10
             )
-            for line in result.stdout.split('\n'):
-                parts = line.split()
-                for part in parts:
-                    if '/' in part and '.' in part and part.startswith('192.'):
-                        return part.split('/')[0]
+            ip = _find_ipv4(result.stdout, '192.')
+            if ip:
+                return ip
         except Exception:
             pass
 
@@ -1307,59 +1840,138 @@ def wait_for_vm_ip(name: str, timeout: int = 300) -> str:
                 capture_output=True, text=True, timeout=10
             )
             for line in result.stdout.split('\n'):
-                line_lower = line.lower()
                 # Match by MAC address ONLY - hostname can be stale from previous VMs
-                if vm_mac and vm_mac in line_lower:
-                    parts = line.split()
-                    for part in parts:
-                        if '/' in part and '.' in part and part.startswith('192.'):
-                            ip = part.split('/')[0]
-                            log(f"Found IP {ip} for VM {name} (MAC: {vm_mac})")
-                            return ip
+                if vm_mac and vm_mac in line.lower():
+                    ip = _find_ipv4(line, '192.')
+                    if ip:
+                        log(f"Found IP {ip} for VM {name} (MAC: {vm_mac})")
+                        return ip
         except Exception:
             pass
 
-        time.sleep(10)
+        ip = pause()
+        if ip:
+            log(f"Found IP {ip} for VM {name} in dnsmasq leases (MAC: {vm_mac})")
+            return ip
 
     raise TimeoutError(f"VM {name} did not get IP within {timeout}s")
 
 
+PUBLIC_IP_SERVICES = ('https://ifconfig.me', 'https://api.ipify.org')
+
+
+@functools.lru_cache(maxsize=1)
 def get_public_ip() -> str:
-    """Get the host's public IP address."""
-    # Try multiple methods
-    methods = [
-        # Check for public IP on interfaces
-        lambda: subprocess.run(
-            ['hostname', '-I'],
-            capture_output=True, text=True, timeout=5
-        ).stdout.split()[0] if not subprocess.run(
-            ['hostname', '-I'], capture_output=True, text=True, timeout=5
-        ).stdout.split()[0].startswith(('192.168.', '10.', '172.')) else None,
-        # Use external service
-        lambda: urllib.request.urlopen('https://ifconfig.me', timeout=5).read().decode().strip(),
-        lambda: urllib.request.urlopen('https://api.ipify.org', timeout=5).read().decode().strip(),
-    ]
+    """Get the host's public IP address (cached; it doesn't change during a run)."""
+    import ipaddress
+    import urllib.request
 
-    for method in methods:
+    def is_public(ip: str) -> bool:
         try:
-            ip = method()
-            if ip and not ip.startswith(('192.168.', '10.', '172.16.', '172.17.', '172.18.')):
-                return ip
-        except Exception:
-            continue
+            return ipaddress.ip_address(ip).is_global
+        except ValueError:
+            return False
 
-    # Fallback: get first non-private IP from hostname -I
+    # Interface addresses first: a single hostname -I and no network round-trip
     try:
         result = subprocess.run(['hostname', '-I'], capture_output=True, text=True, timeout=5)
         for ip in result.stdout.split():
-            if not ip.startswith(('192.168.', '10.', '172.', '127.')):
+            if is_public(ip) and ':' not in ip:
                 return ip
-    except Exception:
+    except (OSError, subprocess.SubprocessError):
         pass
 
+    for url in PUBLIC_IP_SERVICES:
+        try:
+            with urllib.request.urlopen(url, timeout=5) as response:
+                ip = response.read().decode().strip()
+        except Exception:
+            continue
+        if is_public(ip):
+            return ip
+
     raise RuntimeError("Could not determine public IP address")
 
 
+def read_iptables_rules() -> tuple[dict[str, list[str]], dict[str, set[str]]]:
+    """Return '-A' rule lines and chain names per table from one iptables-save."""
+    result = subprocess.run(['sudo', 'iptables-save'], capture_output=True, text=True)
+    rules: dict[str, list[str]] = {}
+    chains: dict[str, set[str]] = {}
+    table = ""
+    if result.returncode != 0:
+        log(f"Warning: iptables-save failed: {result.stderr.strip()}")
+        return rules, chains
+    for line in result.stdout.splitlines():
+        if line.startswith('*'):
+            table = line[1:]
+            rules[table] = []
+            chains[table] = set()
+        elif table and line.startswith(':'):
+            chains[table].add(line[1:].split()[0])
+        elif table and line.startswith('-A '):
+            rules[table].append(line)
+    return rules, chains
+
+
+def parse_iptables_rule(rule: str) -> tuple[str, dict[str, str]]:
+    """Split an iptables-save '-A CHAIN ...' line into its chain and {option: value}.
+
+    Negated options are keyed with a leading '!' (e.g. '!-d'); host addresses
+    drop the /32 suffix iptables-save adds.
+    """
+    # iptables-save only double-quotes comment strings; no need for shlex
+    parts = [bare or quoted for quoted, bare in _IPTABLES_TOKEN_RE.findall(rule)]
+    opts: dict[str, str] = {}
+    negate = False
+    index = 2
+    while index < len(parts):
+        token = parts[index]
+        index += 1
+        if token == '!':
+            negate = True
+            continue
+        value = ""
+        if index < len(parts) and not parts[index].startswith('-') and parts[index] != '!':
+            value = parts[index]
+            index += 1
+        if value.endswith('/32'):
+            value = value[:-3]
+        opts[('!' if negate else '') + token] = value
+        negate = False
+    return parts[1], opts
+
+
+def apply_iptables_rules(table: str, rules: list[str], required_chain: str = "") -> None:
+    """
+    Apply rule lines for one table with a single iptables-restore --noflush.
+
+    The table commits atomically; if the batch is rejected, rules are applied
+    one by one so a single bad rule only costs that rule. Failures on
+    required_chain inserts raise, everything else is logged.
+    """
+    if not rules:
+        return
+    batch = "\n".join([f"*{table}", *rules, "COMMIT", ""])
+    result = subprocess.run(
+        ['sudo', 'iptables-restore', '--noflush'],
+        input=batch,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode == 0:
+        return
+    log(f"Warning: iptables-restore failed for {table} ({result.stderr.strip()}); applying rules individually")
+    for rule in rules:
+        args = shlex.split(rule)
+        result = subprocess.run(['sudo', 'iptables', '-t', table] + args, capture_output=True, text=True)
+        if result.returncode == 0:
+            continue
+        if args[0] != '-D' and args[1] == required_chain:
+            raise RuntimeError(f"Failed to insert {required_chain} rule: {result.stderr}")
+        log(f"Warning: Failed to apply iptables rule '{rule}': {result.stderr.strip()}")
+
+
 def setup_port_forward(
     vm_ip: str,
     vm_port: int,
@@ -1403,7 +2015,7 @@ def setup_port_forward(
                     bridge_ip = parts[src_index]
             return
 
-    def ensure_bridge_egress() -> None:
+    def find_ext_iface() -> str:
         result = subprocess.run(
             ['ip', '-4', 'route', 'show', 'default'],
             capture_output=True,
@@ -1411,7 +2023,7 @@ def setup_port_forward(
         )
         if result.returncode != 0:
             log("Warning: failed to read default route; skipping egress rules")
-            return
+            return ""
         ext_iface = ""
         for line in result.stdout.splitlines():
             parts = line.split()
@@ -1422,223 +2034,101 @@ def setup_port_forward(
                     break
         if not ext_iface or ext_iface == "virbr0":
             log("Warning: could not determine external interface for NAT")
-            return
-
-        def ensure_rule(
-            *,
-            table: str | None,
-            chain: str,
-            rule: list[str],
-            insert: bool = False,
-        ) -> None:
-            base = ['sudo', 'iptables']
-            if table:
-                base += ['-t', table]
-            check_cmd = base + ['-C', chain] + rule
-            if subprocess.run(check_cmd, capture_output=True).returncode == 0:
-                return
-            if insert:
-                add_cmd = base + ['-I', chain, '1'] + rule
-            else:
-                add_cmd = base + ['-A', chain] + rule
-            add_result = subprocess.run(add_cmd, capture_output=True, text=True)
-            if add_result.returncode != 0:
-                log(f"Warning: Failed to add {chain} egress rule: {add_result.stderr}")
-
-        ensure_rule(
-            table=None,
-            chain="FORWARD",
-            rule=['-i', 'virbr0', '-o', ext_iface, '-s', bridge_subnet, '-j', 'ACCEPT'],
-            insert=True,
-        )
-        ensure_rule(
-            table=None,
-            chain="FORWARD",
-            rule=[
-                '-i', ext_iface, '-o', 'virbr0', '-d', bridge_subnet,
-                '-m', 'conntrack', '--ctstate', 'RELATED,ESTABLISHED', '-j', 'ACCEPT',
-            ],
-            insert=True,
-        )
-        ensure_rule(
-            table="nat",
-            chain="POSTROUTING",
-            rule=['-s', bridge_subnet, '!', '-d', bridge_subnet, '-o', ext_iface, '-j', 'MASQUERADE'],
-            insert=False,
-        )
-
-    def remove_nat_rules(chain: str) -> None:
-        result = subprocess.run(
-            ['sudo', 'iptables', '-t', 'nat', '-L', chain, '--line-numbers', '-n'],
-            capture_output=True,
-            text=True,
-        )
-        if result.returncode != 0:
-            return
-        rule_numbers = []
-        for line in result.stdout.splitlines():
-            parts = line.split()
-            if not parts or not parts[0].isdigit():
-                continue
-            if f"dpt:{host_port}" not in line or "DNAT" not in line:
-                continue
-            if public_ip and public_ip not in line:
-                continue
-            rule_numbers.append(int(parts[0]))
-        for number in reversed(rule_numbers):
-            subprocess.run(
-                ['sudo', 'iptables', '-t', 'nat', '-D', chain, str(number)],
-                capture_output=True,
-            )
+            return ""
+        return ext_iface
 
-    def remove_forward_rules() -> None:
-        for chain in ("FORWARD", "LIBVIRT_FWI"):
-            result = subprocess.run(
-                ['sudo', 'iptables', '-L', chain, '--line-numbers', '-n'],
-                capture_output=True,
-                text=True,
-            )
-            if result.returncode != 0:
-                continue
-            rule_numbers = []
-            for line in result.stdout.splitlines():
-                parts = line.split()
-                if not parts or not parts[0].isdigit():
-                    continue
-                if f"dpt:{vm_port}" in line and vm_ip in line and "ACCEPT" in line:
-                    rule_numbers.append(int(parts[0]))
-            for number in reversed(rule_numbers):
-                subprocess.run(
-                    ['sudo', 'iptables', '-D', chain, str(number)],
-                    capture_output=True,
-                )
-
-    def remove_snat_rules() -> None:
-        if not public_ip:
-            return
-        result = subprocess.run(
-            ['sudo', 'iptables', '-t', 'nat', '-L', 'POSTROUTING', '--line-numbers', '-n'],
-            capture_output=True,
-            text=True,
-        )
-        if result.returncode != 0:
-            return
-        rule_numbers = []
-        for line in result.stdout.splitlines():
-            parts = line.split()
-            if not parts or not parts[0].isdigit():
-                continue
-            if "SNAT" not in line:
-                continue
-            if vm_ip not in line:
-                continue
-            if f"to:{public_ip}" not in line:
-                continue
-            rule_numbers.append(int(parts[0]))
-        for number in reversed(rule_numbers):
-            subprocess.run(
-                ['sudo', 'iptables', '-t', 'nat', '-D', 'POSTROUTING', str(number)],
-                capture_output=True,
-            )
-
-    def remove_hairpin_rules() -> None:
-        result = subprocess.run(
-            ['sudo', 'iptables', '-t', 'nat', '-L', 'POSTROUTING', '--line-numbers', '-n'],
-            capture_output=True,
-            text=True,
-        )
-        if result.returncode != 0:
-            return
-        rule_numbers = []
-        for line in result.stdout.splitlines():
-            parts = line.split()
-            if not parts or not parts[0].isdigit():
-                continue
-            if "SNAT" not in line:
-                continue
-            if vm_ip not in line or f"dpt:{vm_port}" not in line:
-                continue
-            if f"to:{bridge_ip}" not in line:
-                continue
-            rule_numbers.append(int(parts[0]))
-        for number in reversed(rule_numbers):
-            subprocess.run(
-                ['sudo', 'iptables', '-t', 'nat', '-D', 'POSTROUTING', str(number)],
-                capture_output=True,
-            )
-
-    def add_nat_rule(chain: str, destination: str | None) -> None:
-        cmd = ['sudo', 'iptables', '-t', 'nat', '-A', chain, '-p', 'tcp']
-        if destination:
-            cmd.extend(['-d', destination])
-        cmd.extend([
-            '--dport', str(host_port),
-            '-j', 'DNAT', '--to-destination', f'{vm_ip}:{vm_port}',
-        ])
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        if result.returncode != 0:
-            raise RuntimeError(f"Failed to add {chain} rule: {result.stderr}")
-
-    # Remove any existing rules for this port first
-    remove_nat_rules('PREROUTING')
-    remove_nat_rules('OUTPUT')
-    remove_forward_rules()
     resolve_bridge_info()
-    ensure_bridge_egress()
-    remove_hairpin_rules()
-    remove_snat_rules()
-
-    # Add PREROUTING rule for incoming traffic (insert at top to avoid stale rules)
-    result = subprocess.run(
-        ['sudo', 'iptables', '-t', 'nat', '-I', 'PREROUTING', '1', '-p', 'tcp']
-        + (['-d', public_ip] if public_ip else [])
-        + ['--dport', str(host_port), '-j', 'DNAT', '--to-destination', f'{vm_ip}:{vm_port}'],
-        capture_output=True,
-        text=True,
-    )
-    if result.returncode != 0:
-        raise RuntimeError(f"Failed to insert PREROUTING rule: {result.stderr}")
-
-    # Add OUTPUT rule so local traffic can reach the VM (used by SSH attestation)
+    ext_iface = find_ext_iface()
+    rules, chains = read_iptables_rules()
+    # Parse each saved rule once; the stale/has-rule checks below all reuse it
+    parsed = {
+        table: [(rule, *parse_iptables_rule(rule)) for rule in table_rules]
+        for table, table_rules in rules.items()
+    }
+    nat_rules: list[str] = []
+    filter_rules: list[str] = []
+
+    def has_rule(table: str, chain: str, wanted: dict[str, str]) -> bool:
+        for _, rule_chain, opts in parsed.get(table, []):
+            if rule_chain == chain and all(opts.get(key) == value for key, value in wanted.items()):
+                return True
+        return False
+
+    def stale_rules(table: str, predicate) -> list[str]:
+        # iptables-save lines replay verbatim as deletes: "-A CHAIN ..." -> "-D CHAIN ..."
+        stale = []
+        for rule, chain, opts in parsed.get(table, []):
+            if predicate(chain, opts, rule):
+                stale.append('-D' + rule[2:])
+        return stale
+
+    # Remove any existing rules for this port first (one iptables-save pass)
+    nat_rules += stale_rules('nat', lambda chain, opts, rule: (
+        chain in ('PREROUTING', 'OUTPUT')
+        and opts.get('-j') == 'DNAT'
+        and opts.get('--dport') == str(host_port)
+        and (not public_ip or public_ip in rule)
+    ))
+    nat_rules += stale_rules('nat', lambda chain, opts, rule: (
+        chain == 'POSTROUTING'
+        and opts.get('-j') == 'SNAT'
+        and opts.get('-d') == vm_ip
+        and opts.get('--dport') == str(vm_port)
+        and opts.get('--to-source') == bridge_ip
+    ))
+    if public_ip:
+        nat_rules += stale_rules('nat', lambda chain, opts, rule: (
+            chain == 'POSTROUTING'
+            and opts.get('-j') == 'SNAT'
+            and opts.get('-s') == vm_ip
+            and opts.get('--to-source') == public_ip
+        ))
+    filter_rules += stale_rules('filter', lambda chain, opts, rule: (
+        chain in ('FORWARD', 'LIBVIRT_FWI')
+        and opts.get('-j') == 'ACCEPT'
+        and opts.get('-d') == vm_ip
+        and opts.get('--dport') == str(vm_port)
+    ))
+
+    # Bridge egress: only add rules that aren't already present
+    if ext_iface:
+        egress_out = {'-i': 'virbr0', '-o': ext_iface, '-s': bridge_subnet, '-j': 'ACCEPT'}
+        if not has_rule('filter', 'FORWARD', egress_out):
+            filter_rules.append(f"-I FORWARD 1 -i virbr0 -o {ext_iface} -s {bridge_subnet} -j ACCEPT")
+        egress_in = {
+            '-i': ext_iface, '-o': 'virbr0', '-d': bridge_subnet,
+            '--ctstate': 'RELATED,ESTABLISHED', '-j': 'ACCEPT',
+        }
+        if not has_rule('filter', 'FORWARD', egress_in):
+            filter_rules.append(
+                f"-I FORWARD 1 -i {ext_iface} -o virbr0 -d {bridge_subnet} "
+                "-m conntrack --ctstate RELATED,ESTABLISHED -j ACCEPT"
+            )
+        masquerade = {'-s': bridge_subnet, '!-d': bridge_subnet, '-o': ext_iface, '-j': 'MASQUERADE'}
+        if not has_rule('nat', 'POSTROUTING', masquerade):
+            nat_rules.append(f"-A POSTROUTING -s {bridge_subnet} ! -d {bridge_subnet} -o {ext_iface} -j MASQUERADE")
+
+    dnat = f"-p tcp --dport {host_port} -j DNAT --to-destination {vm_ip}:{vm_port}"
+    # PREROUTING rule for incoming traffic (insert at top to avoid stale rules)
+    nat_rules.append(f"-I PREROUTING 1 -d {public_ip} {dnat}" if public_ip else f"-I PREROUTING 1 {dnat}")
+    # OUTPUT rule so local traffic can reach the VM (used by SSH attestation)
     output_destination = public_ip if public_ip else '127.0.0.1'
-    try:
-        add_nat_rule('OUTPUT', output_destination)
-    except RuntimeError as exc:
-        log(f"Warning: Failed to add OUTPUT rule: {exc}")
-
-    # Allow inbound traffic to virbr0 before libvirt's default reject.
-    result = subprocess.run([
-        'sudo', 'iptables', '-I', 'LIBVIRT_FWI', '1',
-        '-p', 'tcp', '-d', vm_ip, '--dport', str(vm_port),
-        '-j', 'ACCEPT'
-    ], capture_output=True, text=True)
-    if result.returncode != 0:
-        log(f"Warning: Failed to add LIBVIRT_FWI rule: {result.stderr}")
-
-    result = subprocess.run(
-        [
-            'sudo', 'iptables', '-t', 'nat', '-I', 'POSTROUTING', '1',
-            '-s', bridge_subnet, '-d', vm_ip, '-p', 'tcp', '--dport', str(vm_port),
-            '-j', 'SNAT', '--to-source', bridge_ip,
-        ],
-        capture_output=True,
-        text=True,
+    nat_rules.append(f"-A OUTPUT -d {output_destination} {dnat}")
+    nat_rules.append(
+        f"-I POSTROUTING 1 -s {bridge_subnet} -d {vm_ip} -p tcp --dport {vm_port} "
+        f"-j SNAT --to-source {bridge_ip}"
     )
-    if result.returncode != 0:
-        log(f"Warning: Failed to add hairpin SNAT rule: {result.stderr}")
-
     if public_ip:
-        result = subprocess.run(
-            [
-                'sudo', 'iptables', '-t', 'nat', '-I', 'POSTROUTING', '1',
-                '-s', vm_ip, '!', '-d', bridge_subnet,
-                '-j', 'SNAT', '--to-source', public_ip,
-            ],
-            capture_output=True,
-            text=True,
-        )
-        if result.returncode != 0:
-            log(f"Warning: Failed to add SNAT rule: {result.stderr}")
+        nat_rules.append(f"-I POSTROUTING 1 -s {vm_ip} ! -d {bridge_subnet} -j SNAT --to-source {public_ip}")
+    # Allow inbound traffic to virbr0 before libvirt's default reject.
+    if 'LIBVIRT_FWI' in chains.get('filter', set()):
+        filter_rules.append(f"-I LIBVIRT_FWI 1 -p tcp -d {vm_ip} --dport {vm_port} -j ACCEPT")
+    else:
+        log("Warning: LIBVIRT_FWI chain not found; skipping inbound accept rule")
+
+    # One atomic iptables-restore per table instead of a sudo iptables per rule
+    apply_iptables_rules('nat', nat_rules, required_chain='PREROUTING')
+    apply_iptables_rules('filter', filter_rules)
 
     destination_desc = public_ip if public_ip else '*'
     log(f"Port forwarding configured: {destination_desc}:{host_port} -> {vm_ip}:{vm_port}")
@@ -1650,6 +2140,7 @@ def wait_for_ready(ip: str, port: int = 8080, timeout: int = 300) -> None:
     import socket
     start = time.time()
     last_print = 0
+    attempt = 0
 
     while time.time() - start < timeout:
         elapsed = int(time.time() - start)
@@ -1658,36 +2149,43 @@ def wait_for_ready(ip: str, port: int = 8080, timeout: int = 300) -> None:
             log(f"Waiting for port {port}... ({elapsed}s elapsed)")
 
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(5)
-            result = sock.connect_ex((ip, port))
-            sock.close()
-            if result == 0:
-                log(f"Port {port} is open on {ip}")
-                time.sleep(2)
-                return
-        except Exception:
+            with socket.create_connection((ip, port), timeout=5):
+                pass
+            log(f"Port {port} is open on {ip}")
+            time.sleep(2)
+            return
+        except OSError:
             pass
-        time.sleep(5)
+        time.sleep(backoff_delay(attempt, cap=10.0))
+        attempt += 1
 
     raise TimeoutError(f"Port {port} not ready within {timeout}s")
 
 
 def get_quote_from_vm(ip: str, port: int = 8080) -> str:
     """Retrieve quote from VM via HTTP. Returns base64-encoded quote."""
+    import urllib.request
     url = f"http://{ip}:{port}/quote.json"
     log(f"Fetching quote from {url}")
 
-    response = urllib.request.urlopen(url, timeout=30)
-    data = json.loads(response.read().decode())
+    with urllib.request.urlopen(url, timeout=30) as response:
+        data = loads_json(response.read())
 
     if not data.get("success"):
         raise RuntimeError(f"Quote generation failed in VM: {data.get('error', 'unknown')}")
 
-    if not data.get("quote"):
-        raise RuntimeError("No quote in VM response")
+    # Older images embed the base64 quote directly in quote.json
+    if data.get("quote"):
+        return data["quote"]
 
-    return data["quote"]
+    quote_path = data.get("quote_path")
+    if not quote_path:
+        raise RuntimeError("No quote in VM response")
+    with urllib.request.urlopen(f"http://{ip}:{port}/{quote_path}", timeout=30) as response:
+        quote = response.read()
+    if not quote:
+        raise RuntimeError("Empty quote in VM response")
+    return base64.b64encode(quote).decode()
 
 
 def create_td_vm(
@@ -1749,8 +2247,7 @@ def create_td_vm(
 
 def destroy_td_vm(name: str = "ee-workload") -> None:
     """Destroy a TD VM."""
-    subprocess.run(['sudo', 'virsh', 'destroy', name], capture_output=True)
-    subprocess.run(['sudo', 'virsh', 'undefine', name], capture_output=True)
+    virsh_destroy_undefine(name)
 
 
 def cleanup_td_vms(prefixes: Sequence[str] | None = None) -> None:
@@ -1761,51 +2258,109 @@ def cleanup_td_vms(prefixes: Sequence[str] | None = None) -> None:
         prefixes = (prefixes,)
     else:
         prefixes = tuple(prefixes)
-    result = subprocess.run(
-        ['sudo', 'virsh', 'list', '--all', '--name'],
-        capture_output=True,
-        text=True,
-    )
-    if result.returncode != 0:
-        log(f"Warning: failed to list VMs: {result.stderr.strip()}")
+    names = list_vm_names()
+    if names is None:
         return
-    for name in [line.strip() for line in result.stdout.splitlines() if line.strip()]:
+    for name in names:
         if not name.startswith(prefixes):
             continue
         log(f"Cleaning up existing VM {name}...")
-        subprocess.run(['sudo', 'virsh', 'destroy', name], capture_output=True)
-        subprocess.run(['sudo', 'virsh', 'undefine', name, '--nvram', '--remove-all-storage'], capture_output=True)
+        virsh_destroy_undefine(name, '--nvram', '--remove-all-storage')
+
+
+_GITHUB_CONNECTIONS = threading.local()
+GITHUB_IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "PUT", "DELETE", "OPTIONS"})
+GITHUB_MAX_REDIRECTS = 5
+
+
+def github_api_request(
+    method: str,
+    url: str,
+    headers: dict,
+    data: bytes | None = None,
+    _redirects: int = 0,
+) -> bytes:
+    """
+    Send a GitHub API request over a keep-alive HTTPS connection.
+
+    Connections are cached per thread and host, so a burst of release calls
+    pays for one TLS handshake instead of one per request. GET and HEAD follow
+    redirects; any other 3xx is raised as an HTTPError.
+    """
+    import http.client
+    import urllib.error
+    from urllib.parse import urljoin, urlsplit
+    parts = urlsplit(url)
+    path = parts.path + (f"?{parts.query}" if parts.query else "")
+    headers = {"User-Agent": "easy-enclave", **headers}
+    local = _GITHUB_CONNECTIONS
+    connections = getattr(local, "by_host", None)
+    if connections is None:
+        connections = local.by_host = {}
+    for attempt in range(2):
+        conn = connections.get(parts.netloc)
+        reused = conn is not None
+        if conn is None:
+            conn = connections[parts.netloc] = http.client.HTTPSConnection(parts.netloc, timeout=30)
+        try:
+            conn.request(method, path, body=data, headers=headers)
+            response = conn.getresponse()
+            body = response.read()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            conn.close()
+            connections.pop(parts.netloc, None)
+            # The server may have closed an idle keep-alive connection. Only
+            # replay methods that are safe to repeat: a POST may have landed.
+            if attempt or not reused or method not in GITHUB_IDEMPOTENT_METHODS:
+                raise
+            continue
+        except Exception:
+            conn.close()
+            connections.pop(parts.netloc, None)
+            raise
+        if 300 <= response.status < 400:
+            location = response.headers.get("Location")
+            if method not in ("GET", "HEAD") or not location or _redirects >= GITHUB_MAX_REDIRECTS:
+                raise urllib.error.HTTPError(url, response.status, response.reason, response.headers, None)
+            target = urljoin(url, location)
+            if urlsplit(target).netloc != parts.netloc:
+                # Never forward the token to another host
+                headers = {k: v for k, v in headers.items() if k.lower() != "authorization"}
+            return github_api_request(method, target, headers, data, _redirects=_redirects + 1)
+        if response.status >= 400:
+            raise urllib.error.HTTPError(url, response.status, response.reason, response.headers, None)
+        return body
+    raise RuntimeError("unreachable")
 
 
 def cleanup_deploy_releases(repo: str, token: str, prefix: str = "deploy-") -> None:
     """Delete existing deploy releases so only one remains."""
+    from concurrent.futures import ThreadPoolExecutor
     headers = {
         "Accept": "application/vnd.github+json",
         "Authorization": f"Bearer {token}",
         "X-GitHub-Api-Version": "2022-11-28",
     }
     try:
-        req = urllib.request.Request(
-            f"https://api.github.com/repos/{repo}/releases?per_page=100",
-            headers=headers,
-        )
-        with urllib.request.urlopen(req) as response:
-            releases = json.loads(response.read().decode())
-        for release in releases:
-            tag = release.get("tag_name", "")
-            release_id = release.get("id")
-            if not tag.startswith(prefix) or not release_id:
-                continue
-            delete_req = urllib.request.Request(
-                f"https://api.github.com/repos/{repo}/releases/{release_id}",
-                headers=headers,
-                method="DELETE",
-            )
+        releases = loads_json(github_api_request(
+            "GET", f"https://api.github.com/repos/{repo}/releases?per_page=100", headers,
+        ))
+        stale = [
+            (release.get("tag_name", ""), release.get("id"))
+            for release in releases
+            if release.get("tag_name", "").startswith(prefix) and release.get("id")
+        ]
+
+        def delete_release(tag: str, release_id: int) -> None:
             try:
-                with urllib.request.urlopen(delete_req):
-                    pass
+                github_api_request("DELETE", f"https://api.github.com/repos/{repo}/releases/{release_id}", headers)
             except Exception as exc:
                 log(f"Warning: failed to delete release {tag}: {exc}")
+
+        # Deletes are independent; overlap the round-trips.
+        if stale:
+            with ThreadPoolExecutor(max_workers=min(8, len(stale))) as executor:
+                list(executor.map(lambda item: delete_release(*item), stale))
     except Exception as e:
         log(f"Warning: release cleanup failed: {e}")
 
@@ -1839,6 +2394,9 @@ def create_release(
         "sealed": seal_vm,
     }
 
+    # Serialized once: embedded in the release body and uploaded as the asset
+    attestation_json = json.dumps(attestation, indent=2)
+
     body = f"""## TDX Attested Deployment
 
 **Endpoint**: {endpoint}
@@ -1848,7 +2406,7 @@ def create_release(
 ### Attestation Data
 
 ```json
-{json.dumps(attestation, indent=2)}
+{attestation_json}
 ```
 
 ### Verification
@@ -1871,27 +2429,24 @@ client = connect("{repo}")
         "draft": False,
         "prerelease": False,
     }
-    req = urllib.request.Request(
+    release_data = loads_json(github_api_request(
+        "POST",
         f"https://api.github.com/repos/{repo}/releases",
-        data=json.dumps(payload).encode(),
-        headers={**headers, "Content-Type": "application/json"},
-        method="POST",
-    )
-    with urllib.request.urlopen(req) as response:
-        release_data = json.loads(response.read().decode())
+        {**headers, "Content-Type": "application/json"},
+        json.dumps(payload).encode(),
+    ))
     upload_url = release_data.get("upload_url", "").split("{", 1)[0]
     if not upload_url:
         raise RuntimeError("Release upload URL missing")
 
-    attestation_bytes = json.dumps(attestation, indent=2).encode()
-    upload_req = urllib.request.Request(
+    attestation_bytes = attestation_json.encode()
+    github_api_request(
+        "POST",
         f"{upload_url}?name=attestation.json",
-        data=attestation_bytes,
-        headers={**headers, "Content-Type": "application/json"},
-        method="POST",
+        {**headers, "Content-Type": "application/json"},
+        attestation_bytes,
     )
-    with urllib.request.urlopen(upload_req):
-        log("Uploaded attestation.json")
+    log("Uploaded attestation.json")
 
     return release_data.get("html_url") or f"https://github.com/{repo}/releases/tag/{tag}"
 
@@ -203,7 +203,7 @@ PY
       -out /etc/nginx/ssl/admin.crt
   fi
   python3 -m venv "$INSTALL_DIR/venv"
-  "$INSTALL_DIR/venv/bin/pip" install --no-cache-dir aiohttp cryptography requests
+  "$INSTALL_DIR/venv/bin/pip" install --no-cache-dir aiohttp cryptography requests orjson pybase64 uvloop
 
   cp "$INSTALLER_SRC/systemd/ee-agent.service" /etc/systemd/system/
   systemctl daemon-reload
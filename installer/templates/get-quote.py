@@ -1,9 +1,10 @@
 #!/usr/bin/env python3
-import base64
 import json
 import os
 import tempfile
 
+QUOTE_BIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "quote.bin")
+
 
 def get_tdx_quote():
     tsm_path = "/sys/kernel/config/tsm/report"
@@ -29,9 +30,12 @@ try:
     quote = get_tdx_quote()
     if len(quote) < 100:
         raise RuntimeError(f"Quote too small ({len(quote)} bytes)")
+    # Serve the raw quote; the host base64-encodes it only when embedding in JSON.
+    with open(QUOTE_BIN, 'wb') as f:
+        f.write(quote)
     print(json.dumps({
         "success": True,
-        "quote": base64.b64encode(quote).decode(),
+        "quote_path": "quote.bin",
         "size": len(quote)
     }))
 except Exception as e:
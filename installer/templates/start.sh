@@ -26,7 +26,7 @@ fi
 # Generate TDX quote first
 echo "Starting quote generation..."
 python3 /opt/workload/get-quote.py > /opt/workload/quote.json 2>/opt/workload/quote.log || echo '{"success": false, "error": "quote generation failed"}' > /opt/workload/quote.json
-chmod 644 /opt/workload/quote.json /opt/workload/quote.log 2>/dev/null || true
+chmod 644 /opt/workload/quote.json /opt/workload/quote.bin /opt/workload/quote.log 2>/dev/null || true
 echo "Quote generation done: $(cat /opt/workload/quote.json | head -c 100)..."
 
 # Create response HTML